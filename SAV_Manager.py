@@ -11,27 +11,126 @@ License: MIT
 - MD5 哈希值去重检测
 - 自动备份与恢复
 - 清理游戏目录
+
+命令行 (无参数时进入交互菜单):
+    SAV_Manager.py install|restore|status|clean|verify|resume|watch [--json] [--source/--target/--backup 目录]
+
+也可作为模块导入, 调用 api_install / api_restore / api_status / api_clean / api_verify
+(导入时不执行任何操作)
 """
 
 import os
 import sys
+import json
+import time
+import mmap
+import lzma
+import zlib
 import shutil
+import queue
+import random
+import tempfile
+import platform
+import fnmatch
 import hashlib
+import pstats
+import cProfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
 
-# 设置控制台编码
-if sys.platform == 'win32':
-    os.system('chcp 65001 >nul')
-    os.system('title Ready Or Not - SAV Manager v2.0')
-    os.system('mode con cols=78 lines=42')
-    os.system('color 0A')
+def default_target_dir():
+    """游戏存档目录: %LOCALAPPDATA%\\ReadyOrNot\\Saved\\SaveGames"""
+    local_appdata = os.environ.get('LOCALAPPDATA') or Path.home() / 'AppData' / 'Local'
+    return Path(local_appdata) / 'ReadyOrNot' / 'Saved' / 'SaveGames'
 
 # 目录设置
 SCRIPT_DIR = Path(__file__).parent
-TARGET_DIR = Path(os.environ['LOCALAPPDATA']) / 'ReadyOrNot' / 'Saved' / 'SaveGames'
+TARGET_DIR = default_target_dir()
 BACKUP_DIR = SCRIPT_DIR / '_SAV_BACKUP'
 HASH_LOG = SCRIPT_DIR / '_hash_log.txt'
+HASH_CACHE_FILE = SCRIPT_DIR / '_hash_cache.json'
+MANIFEST_FILE = SCRIPT_DIR / '_sav_manifest.json'
+JOURNAL_FILE = SCRIPT_DIR / '_sav_journal.jsonl'
+OPS_LOG_FILE = SCRIPT_DIR / '_sav_ops.jsonl'
+
+# 结构化操作日志: 每次操作一条汇总记录 (各阶段耗时, 缓存命中率) 和每个文件一条记录;
+# 写入先进入缓冲区, 操作结束时统一写出, 超过大小上限时轮换为 .1
+OPS_LOG_ENABLED = True
+OPS_LOG_BUFFER = 256 * 1024
+OPS_LOG_MAX_BYTES = 8 * 1024 * 1024
+
+# 哈希缓存设置
+HASH_CACHE_MAX_ENTRIES = 4096
+FORCE_REHASH = False
+
+# 扫描时跳过的子目录 (不进入)
+SCAN_EXCLUDE_DIRS = ('_SAV_BACKUP',)
+
+# 源目录中多个同名文件 (不同子目录) 只安装一个: 'newest' 最新 / 'largest' 最大 / 'first' 最先扫描到
+NAME_CONFLICT_POLICIES = ('newest', 'largest', 'first')
+NAME_CONFLICT_POLICY = 'newest'
+
+# 并行哈希线程数 (hashlib 处理大块数据时会释放 GIL)
+HASH_WORKERS = min(8, os.cpu_count() or 4)
+
+# 安装流水线: 复制线程数与各阶段队列容量 (队列满时上游阶段等待)
+COPY_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 32
+
+# 清理方式: 'quarantine' 移入隔离区 (与游戏目录同卷, 重命名无需复制, 可撤销) / 'delete' 直接删除
+# 隔离区中超过保留天数或总大小上限的批次在后台删除 (从最旧的开始)
+# 按大小删除时保留最近一次的批次和宽限期 (小时) 内的批次, 保证刚清理的文件总能撤销
+CLEAN_MODE = 'quarantine'
+QUARANTINE_DIR_NAME = '_SAV_QUARANTINE'
+QUARANTINE_KEEP_DAYS = 7
+QUARANTINE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+QUARANTINE_GRACE_HOURS = 24
+
+# 基准测试语料: 每种语料的文件数, 文件大小范围, 最大目录深度, 重复内容比例
+BENCH_PROFILES = {
+    'small': {'files': 2000, 'min_size': 4 * 1024, 'max_size': 64 * 1024, 'depth': 1, 'duplicates': 0.0},
+    'large': {'files': 3, 'min_size': 2 * 1024 ** 3, 'max_size': 3 * 1024 ** 3, 'depth': 0, 'duplicates': 0.0},
+    'deep': {'files': 200, 'min_size': 64 * 1024, 'max_size': 512 * 1024, 'depth': 12, 'duplicates': 0.0},
+    'dupes': {'files': 100, 'min_size': 256 * 1024, 'max_size': 4 * 1024 * 1024, 'depth': 3, 'duplicates': 0.5},
+}
+BENCH_DEFAULT_PROFILES = ('small', 'deep', 'dupes')
+
+# 恢复备份的并行线程数
+RESTORE_WORKERS = 4
+
+# 监视模式: 轮询间隔, 文件大小和修改时间保持不变多久后才安装 (秒),
+# 以及完整重新扫描的间隔 (用于发现原地修改的文件)
+WATCH_INTERVAL = 2.0
+WATCH_DEBOUNCE = 3.0
+WATCH_FULL_RESCAN = 300.0
+
+# 哈希算法与读取方式
+# md5 与历史 _hash_log.txt 保持一致; blake2b 在 64 位机器上通常更快
+HASH_ALGORITHMS = ('md5', 'blake2b', 'sha1', 'sha256')
+HASH_ALGORITHM = 'md5'
+HASH_MODES = ('readinto', 'mmap', 'read')
+HASH_MODE = 'readinto'
+HASH_BUFFER_SIZE = 1024 * 1024
+
+# 同名文件分层比较: 大小 -> 头尾采样 -> 完整哈希
+PREFILTER_SAMPLE_SIZE = 1024 * 1024
+
+# 复制后重新读取目标文件校验哈希
+COPY_VERIFY = False
+# Linux FICLONE ioctl (btrfs/xfs 等支持 reflink 的文件系统)
+FICLONE = 0x40049409
+
+# 备份格式: 'blob' 整文件存储 / 'chunked' 内容分块去重并压缩
+BACKUP_FORMAT = 'blob'
+BACKUP_COMPRESSION = 'zlib'  # 'zlib' / 'lzma' / 'none'
+# 内容分块: 在锚点字节序列之后切分, 同一地图的不同版本插入/删除数据后
+# 其余分块边界不变; 锚点出现概率约 1/65536, 平均块大小约 80 KB
+CHUNK_MIN_SIZE = 16 * 1024
+CHUNK_MAX_SIZE = 1024 * 1024
+CHUNK_ANCHOR = b'\x9e\x37'
 
 # 颜色代码
 class Color:
@@ -44,18 +143,1450 @@ class Color:
     BOLD = '\033[1m'
 
 def clear_screen():
-    os.system('cls' if sys.platform == 'win32' else 'clear')
+    # ANSI 清屏, 无需启动子进程
+    print('\033[2J\033[H', end='', flush=True)
+
+_thread_local = threading.local()
+
+def _get_buffer():
+    """获取当前线程复用的读取缓冲区"""
+    buf = getattr(_thread_local, 'buffer', None)
+    if buf is None:
+        buf = _thread_local.buffer = bytearray(HASH_BUFFER_SIZE)
+    return buf
+
+def _hash_readinto(f, hasher):
+    buf = _get_buffer()
+    view = memoryview(buf)
+    while True:
+        n = f.readinto(buf)
+        if not n:
+            break
+        hasher.update(view[:n])
+
+def _hash_mmap(f, hasher):
+    if os.fstat(f.fileno()).st_size == 0:
+        return
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        hasher.update(mm)
+
+def _hash_read(f, hasher):
+    for chunk in iter(lambda: f.read(HASH_BUFFER_SIZE), b""):
+        hasher.update(chunk)
+
+_HASH_READERS = {
+    'readinto': _hash_readinto,
+    'mmap': _hash_mmap,
+    'read': _hash_read,
+}
+
+def calculate_hash(file_path, algorithm=None, mode=None):
+    """计算文件哈希值 (readinto 复用大缓冲区 / mmap 零拷贝 / read 普通读取)"""
+    hasher = hashlib.new(algorithm or HASH_ALGORITHM)
+    start = time.perf_counter()
+    try:
+        with open(file_path, "rb", buffering=0) as f:
+            _HASH_READERS[mode or HASH_MODE](f, hasher)
+            size = os.fstat(f.fileno()).st_size
+    except (OSError, ValueError):
+        return None
+    record_phase('hash', time.perf_counter() - start, size)
+    return hasher.hexdigest()
 
 def calculate_md5(file_path):
     """计算文件的MD5哈希值"""
-    hash_md5 = hashlib.md5()
+    return calculate_hash(file_path, 'md5')
+
+def stat_signature(st):
+    """文件状态签名: (大小, 修改时间, inode)"""
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+def full_stat(file_path, st=None):
+    """返回带 inode 的 stat 结果; Windows 上 DirEntry.stat() 的 st_ino 恒为 0, 此时重新 stat"""
+    if st is None or not st.st_ino:
+        return os.stat(file_path)
+    return st
+
+class HashCache:
+    """磁盘哈希缓存, 以 (路径, 大小, 修改时间, inode) 判断文件是否变化"""
+
+    VERSION = 1
+
+    def __init__(self, cache_file, max_entries=HASH_CACHE_MAX_ENTRIES):
+        self.cache_file = Path(cache_file)
+        self.max_entries = max_entries
+        self.entries = {}
+        self.dirty = False
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """从磁盘读取缓存, 文件损坏时视为空缓存"""
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.entries = data.get('entries', {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    @staticmethod
+    def _key(file_path):
+        return os.path.abspath(file_path)
+
+    @staticmethod
+    def _matches(entry, st):
+        return (entry.get('size'), entry.get('mtime_ns'), entry.get('ino')) == stat_signature(st)
+
+    def lookup(self, file_path, st, algorithm='md5'):
+        """文件未变化时返回缓存的哈希值, 否则返回 None"""
+        with self.lock:
+            entry = self.entries.get(self._key(file_path))
+            if entry and self._matches(entry, st):
+                digest = entry.get('hashes', {}).get(algorithm)
+                if digest:
+                    entry['used'] = time.time()
+                    self.dirty = True
+                    self.hits += 1
+                    return digest
+            self.misses += 1
+            return None
+
+    def store(self, file_path, st, algorithm, digest):
+        """记录文件哈希值"""
+        key = self._key(file_path)
+        with self.lock:
+            entry = self.entries.get(key)
+            if not entry or not self._matches(entry, st):
+                entry = {
+                    'size': st.st_size,
+                    'mtime_ns': st.st_mtime_ns,
+                    'ino': st.st_ino,
+                    'hashes': {},
+                }
+                self.entries[key] = entry
+            entry['hashes'][algorithm] = digest
+            entry['used'] = time.time()
+            self.dirty = True
+
+    def clear(self):
+        """清空缓存, 下次访问时全部重新计算"""
+        with self.lock:
+            self.entries = {}
+            self.dirty = True
+
+    def evict(self):
+        """超出容量时先淘汰失效条目, 仍超出则按最近使用时间淘汰"""
+        if len(self.entries) <= self.max_entries:
+            return
+        for key in list(self.entries):
+            try:
+                st = os.stat(key)
+            except OSError:
+                del self.entries[key]
+                continue
+            if not self._matches(self.entries[key], st):
+                del self.entries[key]
+        overflow = len(self.entries) - self.max_entries
+        if overflow > 0:
+            oldest = sorted(self.entries, key=lambda k: self.entries[k].get('used', 0))
+            for key in oldest[:overflow]:
+                del self.entries[key]
+
+    def save(self):
+        """写回磁盘 (先写临时文件再替换, 避免中断导致缓存损坏)"""
+        with self.lock:
+            if not self.dirty:
+                return
+            self.evict()
+            tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': self.VERSION, 'entries': self.entries}, f)
+                os.replace(tmp_file, self.cache_file)
+                self.dirty = False
+            except OSError:
+                pass
+
+_hash_cache = None
+_hash_cache_lock = threading.Lock()
+
+def get_hash_cache():
+    """获取全局哈希缓存 (首次使用时加载)"""
+    global _hash_cache
+    with _hash_cache_lock:
+        if _hash_cache is None:
+            _hash_cache = HashCache(HASH_CACHE_FILE)
+            if FORCE_REHASH:
+                _hash_cache.clear()
+        return _hash_cache
+
+def peek_file_hash(file_path, algorithm=None, st=None):
+    """仅从缓存获取文件哈希值, 不读取文件内容"""
     try:
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                hash_md5.update(chunk)
-        return hash_md5.hexdigest()
-    except:
+        st = full_stat(file_path, st)
+    except OSError:
         return None
+    return get_hash_cache().lookup(file_path, st, algorithm or HASH_ALGORITHM)
+
+def get_file_hash(file_path, force=False, algorithm=None, st=None):
+    """获取文件哈希值, 文件未变化时直接使用缓存 (可传入扫描时已获取的 stat 结果)"""
+    algorithm = algorithm or HASH_ALGORITHM
+    cache = get_hash_cache()
+    try:
+        st = full_stat(file_path, st)
+    except OSError:
+        return None
+    if not force:
+        digest = cache.lookup(file_path, st, algorithm)
+        if digest:
+            return digest
+    digest = calculate_hash(file_path, algorithm)
+    if digest is not None:
+        try:
+            # 计算期间文件被修改则不写入缓存
+            if stat_signature(os.stat(file_path)) == stat_signature(st):
+                cache.store(file_path, st, algorithm, digest)
+        except OSError:
+            pass
+    return digest
+
+def hash_files(file_paths, workers=None, force=False):
+    """并行计算多个文件的哈希值, 结果顺序与输入顺序一致"""
+    file_paths = list(file_paths)
+    workers = workers or HASH_WORKERS
+    if workers <= 1 or len(file_paths) <= 1:
+        return [get_file_hash(p, force) for p in file_paths]
+    with ThreadPoolExecutor(max_workers=min(workers, len(file_paths))) as pool:
+        return list(pool.map(lambda p: get_file_hash(p, force), file_paths))
+
+def sample_hash(file_path, size, sample_size=PREFILTER_SAMPLE_SIZE):
+    """计算文件头部和尾部采样的哈希值, 返回 (哈希值, 读取字节数)"""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, "rb") as f:
+        head = f.read(sample_size)
+        hasher.update(head)
+        read = len(head)
+        if size > sample_size:
+            f.seek(max(sample_size, size - sample_size))
+            tail = f.read(sample_size)
+            hasher.update(tail)
+            read += len(tail)
+    return hasher.hexdigest(), read
+
+def compare_files(source_file, target_file, source_hash=None):
+    """分层判断两个文件内容是否相同 (source_hash 为空时仅在需要时计算)
+
+    返回 (是否相同, 判定依据, 读取字节数, 节省字节数),
+    判定依据为 'size' / 'sample' / 'hash'
+    """
+    try:
+        source_size = os.stat(source_file).st_size
+        target_st = os.stat(target_file)
+    except OSError:
+        return False, 'size', 0, 0
+    target_size = target_st.st_size
+
+    # 第一层: 大小不同必然不同
+    if source_size != target_size:
+        return False, 'size', 0, target_size
+
+    # 两边哈希都已缓存时无需再读取
+    source_hash = source_hash or peek_file_hash(source_file)
+    cached = get_hash_cache().lookup(target_file, target_st, HASH_ALGORITHM)
+    if cached and source_hash:
+        return cached == source_hash, 'hash', 0, target_size
+
+    # 第二层: 头尾采样
+    try:
+        source_sample, read_a = sample_hash(source_file, source_size)
+        target_sample, read_b = sample_hash(target_file, target_size)
+    except OSError:
+        return False, 'sample', 0, 0
+    bytes_read = read_a + read_b
+    if source_sample != target_sample:
+        return False, 'sample', bytes_read, max(0, target_size - bytes_read)
+    if target_size <= 2 * PREFILTER_SAMPLE_SIZE:
+        # 采样已覆盖整个文件
+        return True, 'sample', bytes_read, 0
+
+    # 第三层: 完整哈希
+    if not source_hash:
+        source_hash = get_file_hash(source_file)
+        bytes_read += source_size
+    target_hash = cached or get_file_hash(target_file)
+    if not cached:
+        bytes_read += target_size
+    return target_hash == source_hash, 'hash', bytes_read, 0
+
+def partial_path(target_file):
+    """复制/重建过程中使用的临时文件路径 (不以 .sav 结尾, 不会被扫描或被游戏读取)"""
+    target_file = Path(target_file)
+    return target_file.with_name(target_file.name + '.partial')
+
+def _kernel_copy(src_fd, dst_fd, size):
+    """尝试内核加速复制 (reflink -> copy_file_range -> sendfile), 返回所用方式, 不支持时返回 None"""
+    methods = []
+    if sys.platform.startswith('linux'):
+        methods.append('reflink')
+    if hasattr(os, 'copy_file_range'):
+        methods.append('copy_file_range')
+    if hasattr(os, 'sendfile') and sys.platform != 'win32':
+        methods.append('sendfile')
+    for method in methods:
+        try:
+            if method == 'reflink':
+                import fcntl
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            else:
+                offset = 0
+                while offset < size:
+                    if method == 'copy_file_range':
+                        n = os.copy_file_range(src_fd, dst_fd, size - offset, offset, offset)
+                    else:
+                        os.lseek(dst_fd, offset, os.SEEK_SET)
+                        n = os.sendfile(dst_fd, src_fd, offset, size - offset)
+                    if n == 0:
+                        break
+                    offset += n
+                if offset != size:
+                    raise OSError(f"{method} 复制不完整")
+            return method
+        except (ImportError, OSError, AttributeError):
+            # 回退到下一种方式前清空已写入内容
+            os.ftruncate(dst_fd, 0)
+            os.lseek(dst_fd, 0, os.SEEK_SET)
+    return None
+
+def _write_all(dst_f, data):
+    """无缓冲写入可能只写入一部分 (如磁盘将满), 循环直到全部写入"""
+    while data:
+        n = dst_f.write(data)
+        if not n:
+            raise OSError(f"写入失败: {dst_f.name}")
+        data = data[n:]
+
+def _stream_copy(src_f, dst_fs, hasher):
+    """复用缓冲区读取一次, 计算哈希并写入所有目标"""
+    buf = _get_buffer()
+    view = memoryview(buf)
+    while True:
+        n = src_f.readinto(buf)
+        if not n:
+            break
+        hasher.update(view[:n])
+        for dst_f in dst_fs:
+            _write_all(dst_f, view[:n])
+
+def copy_and_hash(source_file, target_file, digest=None, verify=None, algorithm=None):
+    """单次读取完成复制和哈希计算, 返回 (哈希值, 复制方式)
+
+    已知源文件哈希时直接使用内核加速复制 (无需用户态读取),
+    否则在复制数据流的同时计算哈希
+    """
+    return copy_to_many(source_file, [target_file], digest, verify, algorithm)
+
+def copy_to_many(source_file, target_files, digest=None, verify=None, algorithm=None, before_replace=None):
+    """将源文件复制到多个目标, 源文件只读取一次, 返回 (哈希值, 复制方式)
+
+    before_replace(哈希值) 在临时文件替换目标文件之前调用 (用于先写操作日志)
+    """
+    algorithm = algorithm or HASH_ALGORITHM
+    verify = COPY_VERIFY if verify is None else verify
+    src_st = os.stat(source_file)
+    # 先写入临时文件, 完成后原子替换, 中断时不会留下不完整的目标文件
+    tmp_files = [partial_path(t) for t in target_files]
+    dst_fs = []
+    try:
+        with open(source_file, 'rb', buffering=0) as src_f:
+            dst_fs = [open(tmp, 'wb', buffering=0) for tmp in tmp_files]
+            methods = set()
+            streamed = dst_fs
+            if digest:
+                # 哈希已知: 各目标分别尝试内核加速复制, 不支持的目标再统一流式写入
+                streamed = []
+                for dst_f in dst_fs:
+                    method = _kernel_copy(src_f.fileno(), dst_f.fileno(), src_st.st_size)
+                    if method:
+                        methods.add(method)
+                    else:
+                        streamed.append(dst_f)
+            if streamed:
+                os.lseek(src_f.fileno(), 0, os.SEEK_SET)
+                hasher = hashlib.new(algorithm)
+                _stream_copy(src_f, streamed, hasher)
+                if digest and hasher.hexdigest() != digest:
+                    raise OSError(f"源文件内容与缓存的哈希值不一致: {source_file}")
+                digest = hasher.hexdigest()
+                methods.add('stream')
+            for dst_f in dst_fs:
+                dst_f.close()
+        for tmp in tmp_files:
+            if os.stat(tmp).st_size != src_st.st_size:
+                raise OSError(f"复制不完整: {tmp}")
+            shutil.copystat(source_file, tmp)
+
+        if verify:
+            for tmp in tmp_files:
+                target_hash = calculate_hash(tmp, algorithm)
+                if target_hash != digest:
+                    raise OSError(f"复制校验失败: {target_hash} != {digest}")
+        if before_replace:
+            before_replace(digest)
+        for tmp, target in zip(tmp_files, target_files):
+            os.replace(tmp, target)
+    except BaseException:
+        for dst_f in dst_fs:
+            dst_f.close()
+        for tmp in tmp_files:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+        raise
+
+    # 源文件与目标文件的哈希都写入缓存, 后续比较无需再读取
+    cache = get_hash_cache()
+    try:
+        if stat_signature(os.stat(source_file)) == stat_signature(src_st):
+            cache.store(source_file, src_st, algorithm, digest)
+        for target in target_files:
+            cache.store(target, os.stat(target), algorithm, digest)
+    except OSError:
+        pass
+    return digest, '+'.join(sorted(methods))
+
+def iter_chunks(file_path, min_size=None, max_size=None, anchor=None):
+    """按内容切分文件, 依次返回各分块数据"""
+    min_size = min_size or CHUNK_MIN_SIZE
+    max_size = max_size or CHUNK_MAX_SIZE
+    anchor = anchor or CHUNK_ANCHOR
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            start = 0
+            while start < size:
+                limit = min(start + max_size, size)
+                if limit - start <= min_size:
+                    cut = limit
+                else:
+                    pos = mm.find(anchor, start + min_size - len(anchor), limit - len(anchor))
+                    cut = pos + len(anchor) if pos != -1 else limit
+                yield mm[start:cut]
+                start = cut
+
+_CHUNK_CODECS = {
+    b'Z': (lambda d: zlib.compress(d, 6), zlib.decompress),
+    b'X': (lzma.compress, lzma.decompress),
+    b'R': (bytes, bytes),
+}
+_COMPRESSION_TAGS = {'zlib': b'Z', 'lzma': b'X', 'none': b'R'}
+
+def encode_chunk(data, compression=None):
+    """压缩分块 (压缩无收益时原样存储), 首字节为编码标记"""
+    tag = _COMPRESSION_TAGS[compression or BACKUP_COMPRESSION]
+    packed = _CHUNK_CODECS[tag][0](data)
+    if tag != b'R' and len(packed) >= len(data):
+        tag, packed = b'R', data
+    return tag + packed
+
+def decode_chunk(blob):
+    """解压分块"""
+    return _CHUNK_CODECS[blob[:1]][1](blob[1:])
+
+class BackupStore:
+    """内容寻址备份库: 按哈希值存储文件内容, 索引记录 文件名 -> 版本列表
+
+    目录结构:
+        _SAV_BACKUP/objects/<前两位>/<哈希值>        整文件内容 (blob 格式)
+        _SAV_BACKUP/recipes/<前两位>/<哈希值>.json   分块清单 (chunked 格式)
+        _SAV_BACKUP/chunks/<前两位>/<分块哈希>       压缩后的分块
+        _SAV_BACKUP/index.json                      文件名与版本索引
+        _SAV_BACKUP/index.pending.jsonl             批量备份中尚未写回索引的版本 (移动源文件前追加)
+    """
+
+    VERSION = 1
+
+    def __init__(self, backup_dir):
+        self.backup_dir = Path(backup_dir)
+        self.objects_dir = self.backup_dir / 'objects'
+        self.recipes_dir = self.backup_dir / 'recipes'
+        self.chunks_dir = self.backup_dir / 'chunks'
+        self.index_file = self.backup_dir / 'index.json'
+        self.pending_file = self.backup_dir / 'index.pending.jsonl'
+        self.names = {}
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """读取索引, 文件损坏时视为空索引"""
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.names = data.get('names', {})
+        except (OSError, ValueError, AttributeError):
+            self.names = {}
+        # 批量备份中断时索引尚未写回: 重放待写记录 (只重放内容已在备份库中的版本)
+        try:
+            with open(self.pending_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中断时写了一半的最后一行
+                continue
+            if self.has_object(record['entry']['digest']):
+                self._apply_version(record['name'], record['entry'])
+        self.save()
+
+    def save(self):
+        """写回索引 (先写临时文件再替换), 之后清空待写记录"""
+        with self.lock:
+            self.backup_dir.mkdir(parents=True, exist_ok=True)
+            tmp_file = self.index_file.with_name(self.index_file.name + '.tmp')
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump({'version': self.VERSION, 'names': self.names}, f, ensure_ascii=False, indent=1)
+            os.replace(tmp_file, self.index_file)
+            try:
+                os.unlink(self.pending_file)
+            except FileNotFoundError:
+                pass
+
+    def _log_pending(self, name, entry):
+        """追加一条待写记录, 索引写回前中断也能在下次加载时恢复"""
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.pending_file, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({'name': name, 'entry': entry}, ensure_ascii=False) + '\n')
+
+    def object_path(self, digest):
+        return self.objects_dir / digest[:2] / digest
+
+    def recipe_path(self, digest):
+        return self.recipes_dir / digest[:2] / f"{digest}.json"
+
+    def chunk_path(self, chunk_id):
+        return self.chunks_dir / chunk_id[:2] / chunk_id
+
+    def has_object(self, digest):
+        return self.object_path(digest).exists() or self.recipe_path(digest).exists()
+
+    def _write_file(self, path, data):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # 每次写入使用独立的临时文件, 多个线程写同一分块时互不干扰
+        fd, tmp_file = tempfile.mkstemp(prefix=path.name + '.', suffix='.tmp', dir=path.parent)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, path)
+        except OSError:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+            # 其他线程已写入相同内容
+            if not path.exists():
+                raise
+
+    def _store_chunk(self, data):
+        chunk_id = hashlib.blake2b(data, digest_size=20).hexdigest()
+        path = self.chunk_path(chunk_id)
+        if path.exists():
+            return chunk_id, 0
+        blob = encode_chunk(data)
+        self._write_file(path, blob)
+        return chunk_id, len(blob)
+
+    def _store_chunked(self, source_file, digest):
+        """分块存储文件, 已存在的分块直接复用; 压缩在线程池中并行进行"""
+        chunk_ids = []
+        batch = []
+
+        def store_batch():
+            # 同一批中相同的分块 (如大段填充的零) 只写一次
+            unique = list(dict.fromkeys(batch))
+            ids = dict(zip(unique, (cid for cid, _ in pool.map(self._store_chunk, unique))))
+            chunk_ids.extend(ids[data] for data in batch)
+            batch.clear()
+
+        with ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+            for data in iter_chunks(source_file):
+                batch.append(data)
+                if len(batch) >= HASH_WORKERS * 4:
+                    store_batch()
+            store_batch()
+        recipe = {'size': os.stat(source_file).st_size, 'chunks': chunk_ids}
+        self._write_file(self.recipe_path(digest), json.dumps(recipe).encode('utf-8'))
+
+    def add(self, source_file, name, digest, move=True, fmt=None, save=True):
+        """备份文件, 返回 True 表示写入了新内容, False 表示内容已存在 (仅更新索引)
+
+        blob 格式下 move=True 时源文件移入备份库 (同卷为重命名), 否则优先创建硬链接;
+        chunked 格式下分块压缩存储, move=True 时随后删除源文件;
+        批量备份时传入 save=False, 版本先追加到待写记录 (再移动源文件), 全部完成后调用 save()
+        """
+        source_file = Path(source_file)
+        size = source_file.stat().st_size
+        fmt = fmt or BACKUP_FORMAT
+        obj = self.object_path(digest)
+        with self.lock:
+            stored = False
+            exists = self.has_object(digest)
+            if exists:
+                fmt = 'blob' if obj.exists() else 'chunked'
+            entry = self._new_entry(digest, size, fmt)
+            if not save:
+                self._log_pending(name, entry)
+            if exists:
+                # 内容已存在: 只需写索引
+                if move:
+                    source_file.unlink()
+            elif fmt == 'chunked':
+                self._store_chunked(source_file, digest)
+                if move:
+                    source_file.unlink()
+                stored = True
+            else:
+                obj.parent.mkdir(parents=True, exist_ok=True)
+                if move:
+                    try:
+                        os.replace(source_file, obj)
+                    except OSError:
+                        shutil.move(str(source_file), str(obj))
+                else:
+                    try:
+                        os.link(source_file, obj)
+                    except OSError:
+                        copy_and_hash(source_file, obj, digest)
+                stored = True
+
+            self._apply_version(name, entry)
+            if save:
+                self.save()
+            return stored
+
+    @staticmethod
+    def _new_entry(digest, size, fmt):
+        return {
+            'digest': digest,
+            'algorithm': HASH_ALGORITHM,
+            'size': size,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'format': fmt,
+        }
+
+    def _apply_version(self, name, entry):
+        versions = self.names.setdefault(name, [])
+        if versions and versions[-1]['digest'] == entry['digest']:
+            versions[-1]['time'] = entry['time']
+        else:
+            versions.append(entry)
+
+    def record_version(self, name, digest, size, fmt='blob', save=True):
+        """在索引中记录文件版本 (内容须已在备份库中)"""
+        with self.lock:
+            self._apply_version(name, self._new_entry(digest, size, fmt))
+            if save:
+                self.save()
+
+    def versions(self, name):
+        """返回文件的所有版本 (从旧到新)"""
+        return list(self.names.get(name, []))
+
+    def refcount(self, digest):
+        """引用该内容的版本数"""
+        with self.lock:
+            return sum(1 for vs in self.names.values() for v in vs if v['digest'] == digest)
+
+    def discard(self, name, entry):
+        """从索引中移除一个版本, 内容不再被引用时一并删除 (分块由其他内容共享, 保留)"""
+        with self.lock:
+            versions = self.names.get(name, [])
+            if entry in versions:
+                versions.remove(entry)
+            if not versions:
+                self.names.pop(name, None)
+            if not self.refcount(entry['digest']):
+                for path in (self.object_path(entry['digest']), self.recipe_path(entry['digest'])):
+                    try:
+                        path.unlink()
+                    except FileNotFoundError:
+                        pass
+            self.save()
+
+    def restore(self, name, dest_file, version=-1, consume=False):
+        """将指定版本 (默认最新) 恢复到 dest_file, 返回 (版本信息, 恢复方式)
+
+        consume=True 时恢复后从备份库移除该版本; 整文件内容没有其他版本引用时
+        直接重命名到 dest_file, 无需复制
+        """
+        entry = self.names[name][version]
+        algorithm = entry.get('algorithm')
+        obj = self.object_path(entry['digest'])
+        if consume:
+            with self.lock:
+                if obj.exists() and self.refcount(entry['digest']) == 1:
+                    try:
+                        os.replace(obj, dest_file)
+                    except OSError:
+                        pass
+                    else:
+                        get_hash_cache().store(dest_file, os.stat(dest_file), algorithm or HASH_ALGORITHM, entry['digest'])
+                        self.discard(name, entry)
+                        return entry, 'rename'
+        if obj.exists():
+            _, method = copy_and_hash(obj, dest_file, entry['digest'], algorithm=algorithm)
+        elif self.recipe_path(entry['digest']).exists():
+            self._rebuild(entry, dest_file)
+            method = 'rebuild'
+        else:
+            raise FileNotFoundError(f"备份内容缺失: {entry['digest']}")
+        if consume:
+            self.discard(name, entry)
+        return entry, method
+
+    def _rebuild(self, entry, dest_file):
+        """由分块重建文件并校验哈希"""
+        with open(self.recipe_path(entry['digest']), 'r', encoding='utf-8') as f:
+            recipe = json.load(f)
+        algorithm = entry.get('algorithm') or HASH_ALGORITHM
+        hasher = hashlib.new(algorithm)
+
+        def load(chunk_id):
+            with open(self.chunk_path(chunk_id), 'rb') as cf:
+                return decode_chunk(cf.read())
+
+        tmp_file = partial_path(dest_file)
+        try:
+            with open(tmp_file, 'wb') as out, ThreadPoolExecutor(max_workers=HASH_WORKERS) as pool:
+                # 并行解压, 按顺序写出
+                for data in pool.map(load, recipe['chunks']):
+                    hasher.update(data)
+                    out.write(data)
+            if hasher.hexdigest() != entry['digest']:
+                raise OSError(f"重建校验失败: {entry['digest']}")
+            os.replace(tmp_file, dest_file)
+        except BaseException:
+            try:
+                os.unlink(tmp_file)
+            except OSError:
+                pass
+            raise
+        get_hash_cache().store(dest_file, os.stat(dest_file), algorithm, entry['digest'])
+
+    @staticmethod
+    def _dir_bytes(directory):
+        total = 0
+        if directory.exists():
+            for sub in os.scandir(directory):
+                if sub.is_dir():
+                    total += sum(e.stat().st_size for e in os.scandir(sub.path) if e.is_file())
+        return total
+
+    def stats(self):
+        """统计: 文件名数, 版本数, 实际存储的内容数与字节数, 去重率"""
+        digests = {v['digest']: v['size'] for vs in self.names.values() for v in vs}
+        logical_bytes = sum(v['size'] for vs in self.names.values() for v in vs)
+        disk_bytes = sum(self._dir_bytes(d) for d in (self.objects_dir, self.recipes_dir, self.chunks_dir))
+        return {
+            'names': len(self.names),
+            'versions': sum(len(vs) for vs in self.names.values()),
+            'objects': len(digests),
+            'stored_bytes': sum(digests.values()),
+            'logical_bytes': logical_bytes,
+            'disk_bytes': disk_bytes,
+            'dedup_ratio': round(logical_bytes / disk_bytes, 2) if disk_bytes else None,
+        }
+
+    def migrate_legacy(self):
+        """将旧版 <文件名>.sav.bak 平铺备份导入备份库"""
+        migrated = 0
+        for bak_file in sorted(self.backup_dir.glob('*.bak'), key=lambda p: p.stat().st_mtime):
+            digest = get_file_hash(bak_file)
+            if digest is None:
+                continue
+            self.add(bak_file, bak_file.stem, digest, save=False)
+            migrated += 1
+        if migrated:
+            self.save()
+        return migrated
+
+_backup_store = None
+
+def get_backup_store():
+    """获取全局备份库 (首次使用时加载, 并导入旧版 .bak 备份)"""
+    global _backup_store
+    if _backup_store is None:
+        _backup_store = BackupStore(BACKUP_DIR)
+        if BACKUP_DIR.exists():
+            _backup_store.migrate_legacy()
+    return _backup_store
+
+class InstallManifest:
+    """安装清单: 记录每个游戏目录中已安装文件的 大小/修改时间/哈希值/来源"""
+
+    VERSION = 1
+
+    def __init__(self, manifest_file):
+        self.manifest_file = Path(manifest_file)
+        self.targets = {}
+        self.lock = threading.RLock()
+        self.load()
+
+    def load(self):
+        """读取清单, 文件损坏时视为空清单"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get('version') == self.VERSION:
+                self.targets = data.get('targets', {})
+        except (OSError, ValueError, AttributeError):
+            self.targets = {}
+
+    def save(self):
+        """写回清单 (先写临时文件再替换)"""
+        with self.lock:
+            tmp_file = self.manifest_file.with_name(self.manifest_file.name + '.tmp')
+            try:
+                with open(tmp_file, 'w', encoding='utf-8') as f:
+                    json.dump({'version': self.VERSION, 'targets': self.targets}, f, ensure_ascii=False, indent=1)
+                os.replace(tmp_file, self.manifest_file)
+            except OSError:
+                pass
+
+    def entries(self, target_dir):
+        """返回游戏目录的清单条目 {文件名: 条目}"""
+        with self.lock:
+            return self.targets.setdefault(os.path.abspath(target_dir), {})
+
+    def lookup(self, target_dir, name, st):
+        """目标文件自记录以来未变化时返回清单条目, 否则返回 None"""
+        entry = self.entries(target_dir).get(name)
+        if entry and entry['size'] == st.st_size and entry['mtime_ns'] == st.st_mtime_ns:
+            return entry
+        return None
+
+    def record(self, target_dir, name, digest, source=None):
+        """记录已安装文件"""
+        st = os.stat(Path(target_dir) / name)
+        with self.lock:
+            self.entries(target_dir)[name] = {
+                'size': st.st_size,
+                'mtime_ns': st.st_mtime_ns,
+                'digest': digest,
+                'algorithm': HASH_ALGORITHM,
+                'source': str(source) if source else None,
+                'installed': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            }
+
+    def remove(self, target_dir, name):
+        with self.lock:
+            return self.entries(target_dir).pop(name, None)
+
+    def reinstate(self, target_dir, name, entry):
+        """放回之前移除的条目 (文件原样移回时使用)"""
+        with self.lock:
+            self.entries(target_dir)[name] = entry
+
+    def verify(self, target_dir, deep=False):
+        """校验游戏目录与清单是否一致
+
+        快速模式只比较大小和修改时间; 深度模式重新计算哈希值 (忽略缓存)
+        返回 {'ok': [...], 'changed': [...], 'missing': [...], 'untracked': [...]}
+        """
+        target_dir = Path(target_dir)
+        entries = dict(self.entries(target_dir))
+        report = {'ok': [], 'changed': [], 'missing': [], 'untracked': []}
+        on_disk = {}
+        if target_dir.exists():
+            on_disk = {e.name: e.stat() for e in os.scandir(target_dir)
+                       if e.is_file() and e.name.lower().endswith('.sav')}
+        to_hash = []
+        for name in sorted(entries):
+            st = on_disk.get(name)
+            if st is None:
+                report['missing'].append(name)
+            elif deep:
+                to_hash.append(name)
+            elif self.lookup(target_dir, name, st):
+                report['ok'].append(name)
+            else:
+                report['changed'].append(name)
+        if to_hash:
+            digests = hash_files([target_dir / name for name in to_hash], force=True)
+            refreshed = False
+            for name, digest in zip(to_hash, digests):
+                if digest != entries[name]['digest']:
+                    report['changed'].append(name)
+                    continue
+                report['ok'].append(name)
+                # 内容未变但修改时间变化: 更新记录, 之后快速校验不再误报
+                st = on_disk[name]
+                if (entries[name]['size'], entries[name]['mtime_ns']) != (st.st_size, st.st_mtime_ns):
+                    with self.lock:
+                        entries[name].update(size=st.st_size, mtime_ns=st.st_mtime_ns)
+                    refreshed = True
+            if refreshed:
+                self.save()
+        report['untracked'] = sorted(name for name in on_disk if name not in entries)
+        return report
+
+_manifest = None
+
+def get_manifest():
+    """获取全局安装清单 (首次使用时加载)"""
+    global _manifest
+    if _manifest is None:
+        _manifest = InstallManifest(MANIFEST_FILE)
+    return _manifest
+
+class Journal:
+    """预写日志: 记录安装/恢复/清理操作的每个步骤, 中断后可从断点继续
+
+    每行一条 JSON 记录:
+        begin   {batch, op, params}      操作开始
+        step    {batch, key, step, ...}  某个文件的某一步已完成
+        commit  {batch}                  操作完成
+    """
+
+    def __init__(self, journal_file):
+        self.journal_file = Path(journal_file)
+        self.lock = threading.Lock()
+
+    def _append(self, record, sync=False):
+        with self.lock:
+            with open(self.journal_file, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+                f.flush()
+                if sync:
+                    os.fsync(f.fileno())
+
+    def begin(self, op, params=None):
+        """开始一个操作批次, 返回批次编号"""
+        batch = f"{op}-{datetime.now().strftime('%Y%m%d%H%M%S')}-{os.getpid()}-{time.perf_counter_ns()}"
+        self._append({'event': 'begin', 'batch': batch, 'op': op, 'params': params or {}}, sync=True)
+        return batch
+
+    def step(self, batch, key, step, sync=False, **info):
+        """记录某个文件的某一步已完成; 记录先于所描述的操作写入时传入 sync=True 落盘"""
+        self._append(dict(info, event='step', batch=batch, key=key, step=step), sync=sync)
+
+    def commit(self, batch):
+        """标记批次完成; 没有其他未完成批次时清空日志"""
+        self._append({'event': 'commit', 'batch': batch}, sync=True)
+        if not self.pending():
+            with self.lock:
+                try:
+                    os.unlink(self.journal_file)
+                except OSError:
+                    pass
+
+    def pending(self):
+        """返回未完成的批次列表: [{batch, op, params, done: {key: {step: info}}}]"""
+        batches = {}
+        try:
+            with open(self.journal_file, 'r', encoding='utf-8') as f:
+                lines = f.readlines()
+        except OSError:
+            return []
+        for line in lines:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # 中断时写了一半的最后一行
+                continue
+            batch = record.get('batch')
+            if record.get('event') == 'begin':
+                batches[batch] = {'batch': batch, 'op': record['op'], 'params': record['params'], 'done': {}}
+            elif record.get('event') == 'step' and batch in batches:
+                batches[batch]['done'].setdefault(record['key'], {})[record['step']] = record
+            elif record.get('event') == 'commit':
+                batches.pop(batch, None)
+        return list(batches.values())
+
+_journal = None
+
+def get_journal():
+    """获取全局操作日志"""
+    global _journal
+    if _journal is None:
+        _journal = Journal(JOURNAL_FILE)
+    return _journal
+
+class Metrics:
+    """一次操作的性能统计: 各阶段的累计耗时/次数/字节数, 以及哈希缓存命中率
+
+    阶段耗时为各线程耗时之和 (并行时可能超过总耗时); hash 统计所有实际读取文件的哈希计算,
+    其耗时同时计入发起计算的阶段 (scan / compare / status 等)
+    """
+
+    def __init__(self, op):
+        self.op = op
+        self.lock = threading.Lock()
+        self.phases = {}
+        self.start = time.perf_counter()
+        cache = get_hash_cache()
+        self.cache_start = (cache.hits, cache.misses)
+
+    def add(self, phase, seconds, nbytes=0):
+        with self.lock:
+            stat = self.phases.setdefault(phase, {'seconds': 0.0, 'count': 0, 'bytes': 0})
+            stat['seconds'] += seconds
+            stat['count'] += 1
+            stat['bytes'] += nbytes
+
+    def snapshot(self):
+        cache = get_hash_cache()
+        hits, misses = cache.hits - self.cache_start[0], cache.misses - self.cache_start[1]
+        with self.lock:
+            phases = {name: dict(stat, seconds=round(stat['seconds'], 4)) for name, stat in self.phases.items()}
+        return {
+            'op': self.op,
+            'seconds': round(time.perf_counter() - self.start, 4),
+            'phases': phases,
+            'hash_cache': {
+                'hits': hits,
+                'misses': misses,
+                'hit_rate': round(hits / (hits + misses), 3) if hits + misses else None,
+            },
+        }
+
+class OperationLog:
+    """结构化操作日志 (JSON lines): 文件只打开一次, 记录先进入缓冲区"""
+
+    def __init__(self, log_file, buffer_size=OPS_LOG_BUFFER):
+        self.log_file = Path(log_file)
+        self.buffer_size = buffer_size
+        self.lock = threading.Lock()
+        self.file = None
+
+    def _open(self):
+        try:
+            if self.log_file.stat().st_size > OPS_LOG_MAX_BYTES:
+                os.replace(self.log_file, self.log_file.with_name(self.log_file.name + '.1'))
+        except OSError:
+            pass
+        self.file = open(self.log_file, 'a', encoding='utf-8', buffering=self.buffer_size)
+
+    def write(self, record):
+        with self.lock:
+            if self.file is None:
+                self._open()
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.flush()
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+_ops_log = None
+_metrics = None
+# 启用 --cprofile 时收集各工作线程的 cProfile 结果
+_profilers = None
+
+def get_ops_log():
+    """获取全局操作日志"""
+    global _ops_log
+    if _ops_log is None:
+        _ops_log = OperationLog(OPS_LOG_FILE)
+    return _ops_log
+
+def begin_metrics(op):
+    """开始统计一次操作, 之后各阶段通过 record_phase 记录耗时"""
+    global _metrics
+    _metrics = Metrics(op)
+    return _metrics
+
+def record_phase(phase, seconds, nbytes=0):
+    """记录阶段耗时 (没有进行中的统计时忽略)"""
+    metrics = _metrics
+    if metrics is not None:
+        metrics.add(phase, seconds, nbytes)
+
+def end_metrics(metrics, files=(), **summary):
+    """结束统计, 将汇总与每个文件的记录写入操作日志, 返回汇总"""
+    global _metrics
+    if _metrics is metrics:
+        _metrics = None
+    report = dict(metrics.snapshot(), **summary)
+    if OPS_LOG_ENABLED:
+        now = datetime.now().isoformat(timespec='seconds')
+        try:
+            log = get_ops_log()
+            log.write(dict(report, event='op', time=now))
+            for record in files:
+                log.write(dict(record, event='file', op=metrics.op, time=now))
+            log.flush()
+        except OSError:
+            pass
+    return report
+
+def profiled(target):
+    """启用 --cprofile 时在线程内单独采样 (cProfile 只记录当前线程), 结束后与主线程合并"""
+    if _profilers is None:
+        return target
+    def run(*args):
+        profiler = cProfile.Profile()
+        _profilers.append(profiler)
+        return profiler.runcall(target, *args)
+    return run
+
+class Quarantine:
+    """清理隔离区: 每次清理对应一个以时间命名的批次目录, 文件重命名移入, 可整批撤销
+
+    目录结构:
+        <游戏目录上级>/_SAV_QUARANTINE/<时间>/<文件名>
+        <游戏目录上级>/_SAV_QUARANTINE/<时间>/_batch.json   原目录与清单条目
+    """
+
+    META_FILE = '_batch.json'
+
+    def __init__(self, root):
+        self.root = Path(root)
+        self.lock = threading.Lock()
+
+    def _read_meta(self, batch_dir):
+        try:
+            with open(batch_dir / self.META_FILE, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'target': None, 'entries': {}}
+
+    def _write_meta(self, batch_dir, meta):
+        tmp_file = batch_dir / (self.META_FILE + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_file, batch_dir / self.META_FILE)
+
+    def create(self, target_dir):
+        """新建批次目录, 返回其路径"""
+        now = datetime.now()
+        with self.lock:
+            batch_dir = self.root / now.strftime('%Y%m%d-%H%M%S-%f')
+            batch_dir.mkdir(parents=True)
+        self._write_meta(batch_dir, {'target': os.path.abspath(target_dir), 'time': now.timestamp(), 'entries': {}})
+        return batch_dir
+
+    @staticmethod
+    def put(batch_dir, target_dir, name):
+        """将文件重命名移入批次目录 (同卷时不复制数据)"""
+        src, dst = Path(target_dir) / name, Path(batch_dir) / name
+        try:
+            os.replace(src, dst)
+        except FileNotFoundError:
+            raise
+        except OSError:
+            # 不在同一卷 (如游戏目录为挂载点) 时退回复制后删除
+            shutil.move(str(src), str(dst))
+
+    def finish(self, batch_dir, entries):
+        """记录移入文件的清单条目; 批次中没有文件时删除批次目录"""
+        batch_dir = Path(batch_dir)
+        if not self._files(batch_dir):
+            shutil.rmtree(batch_dir, ignore_errors=True)
+            return
+        meta = self._read_meta(batch_dir)
+        meta['entries'].update(entries)
+        self._write_meta(batch_dir, meta)
+
+    def _files(self, batch_dir):
+        try:
+            return [e for e in os.scandir(batch_dir) if e.is_file() and not e.name.startswith(self.META_FILE)]
+        except OSError:
+            return []
+
+    def batches(self):
+        """所有批次 (从旧到新): [{id, path, target, files, bytes, time}]"""
+        result = []
+        try:
+            dirs = sorted((e for e in os.scandir(self.root) if e.is_dir()), key=lambda e: e.name)
+        except OSError:
+            return result
+        for d in dirs:
+            files = self._files(d.path)
+            meta = self._read_meta(Path(d.path))
+            result.append({
+                'id': d.name,
+                'path': d.path,
+                'target': meta.get('target'),
+                'files': len(files),
+                'bytes': sum(e.stat().st_size for e in files),
+                'time': meta.get('time') or d.stat().st_mtime,
+            })
+        return result
+
+    def undo(self, batch_id=None, manifest=None):
+        """将批次 (默认最近一次) 中的文件移回原目录; 原位置已有同名文件时保留在隔离区"""
+        batches = self.batches()
+        if batch_id:
+            batches = [b for b in batches if b['id'] == batch_id]
+        if not batches:
+            raise FileNotFoundError(f"隔离区中没有可撤销的批次: {batch_id or ''}".rstrip(': '))
+        batch = batches[-1]
+        batch_dir = Path(batch['path'])
+        meta = self._read_meta(batch_dir)
+        target_dir = Path(meta['target'] or TARGET_DIR)
+        target_dir.mkdir(parents=True, exist_ok=True)
+        results = []
+        for e in self._files(batch_dir):
+            dest = target_dir / e.name
+            if dest.exists():
+                results.append({'name': e.name, 'error': '游戏目录中已有同名文件'})
+                continue
+            try:
+                os.replace(e.path, dest)
+            except OSError:
+                shutil.move(e.path, str(dest))
+            if manifest and e.name in meta['entries']:
+                manifest.reinstate(target_dir, e.name, meta['entries'][e.name])
+            results.append({'name': e.name})
+        if manifest:
+            manifest.save()
+        if not self._files(batch_dir):
+            shutil.rmtree(batch_dir, ignore_errors=True)
+        return batch['id'], results
+
+    def purge(self, keep_days=None, max_bytes=None):
+        """删除超过保留天数的批次, 再从最旧的开始删除直到总大小不超过上限, 返回删除的批次
+
+        按大小删除时不删除最近一次的批次和宽限期内的批次
+        """
+        keep_days = QUARANTINE_KEEP_DAYS if keep_days is None else keep_days
+        max_bytes = QUARANTINE_MAX_BYTES if max_bytes is None else max_bytes
+        batches = self.batches()
+        total = sum(b['bytes'] for b in batches)
+        now = time.time()
+        cutoff = now - keep_days * 86400
+        grace = now - QUARANTINE_GRACE_HOURS * 3600
+        removed = []
+        for i, b in enumerate(batches):
+            expired = b['time'] < cutoff
+            oversize = total > max_bytes and b['time'] < grace and i < len(batches) - 1
+            if not expired and not oversize:
+                break
+            shutil.rmtree(b['path'], ignore_errors=True)
+            total -= b['bytes']
+            removed.append(b['id'])
+        return removed
+
+_quarantine = None
+_purge_thread = None
+
+def get_quarantine():
+    """获取游戏目录对应的隔离区 (位于游戏目录的上级目录, 保证与游戏目录同卷)"""
+    global _quarantine
+    if _quarantine is None:
+        _quarantine = Quarantine(TARGET_DIR.parent / QUARANTINE_DIR_NAME)
+    return _quarantine
+
+def start_quarantine_purge():
+    """在后台线程中清理过期的隔离批次"""
+    global _purge_thread
+    if _purge_thread is None or not _purge_thread.is_alive():
+        _purge_thread = threading.Thread(target=get_quarantine().purge, daemon=True)
+        _purge_thread.start()
+    return _purge_thread
+
+def benchmark_hashing(file_paths, algorithms=HASH_ALGORITHMS, modes=HASH_MODES, repeat=3):
+    """哈希微基准测试: 返回每种算法/读取方式的吞吐量 (MB/s, 取最快一次)"""
+    file_paths = [Path(p) for p in file_paths]
+    total_bytes = sum(p.stat().st_size for p in file_paths)
+    # 预热一次, 让各组合都在相同的页缓存状态下比较
+    for p in file_paths:
+        calculate_hash(p, 'md5', 'readinto')
+    results = []
+    for algorithm in algorithms:
+        for mode in modes:
+            best = None
+            for _ in range(repeat):
+                start = time.perf_counter()
+                for p in file_paths:
+                    calculate_hash(p, algorithm, mode)
+                elapsed = time.perf_counter() - start
+                best = elapsed if best is None else min(best, elapsed)
+            results.append({
+                'algorithm': algorithm,
+                'mode': mode,
+                'bytes': total_bytes,
+                'seconds': round(best, 4),
+                'mb_per_s': round(total_bytes / (1024 * 1024) / best, 1) if best else None,
+            })
+    return results
+
+def run_hash_benchmark(file_paths):
+    """运行哈希基准测试并打印结果"""
+    file_paths = file_paths or get_sav_files(SCRIPT_DIR)
+    if not file_paths:
+        print("  未找到用于测试的 .sav 文件")
+        return
+    total_mb = sum(Path(p).stat().st_size for p in file_paths) / (1024 * 1024)
+    print(f"\n  哈希基准测试: {len(file_paths)} 个文件, 共 {total_mb:.1f} MB\n")
+    print(f"  {'算法':<10}{'方式':<12}{'耗时(s)':>10}{'MB/s':>10}")
+    for r in benchmark_hashing(file_paths):
+        print(f"  {r['algorithm']:<10}{r['mode']:<12}{r['seconds']:>10}{r['mb_per_s']:>10}")
+    print()
+
+def io_counters():
+    """当前进程累计读写的字节数 {'read', 'written'}, 不支持的平台返回 None"""
+    if os.name == 'nt':
+        import ctypes
+        fields = ('ReadOperationCount', 'WriteOperationCount', 'OtherOperationCount',
+                  'ReadTransferCount', 'WriteTransferCount', 'OtherTransferCount')
+
+        class IO_COUNTERS(ctypes.Structure):
+            _fields_ = [(name, ctypes.c_ulonglong) for name in fields]
+
+        counters = IO_COUNTERS()
+        kernel32 = ctypes.windll.kernel32
+        if kernel32.GetProcessIoCounters(kernel32.GetCurrentProcess(), ctypes.byref(counters)):
+            return {'read': counters.ReadTransferCount, 'written': counters.WriteTransferCount}
+        return None
+    try:
+        with open('/proc/self/io', 'r') as f:
+            fields = dict(line.strip().split(': ') for line in f if ': ' in line)
+        return {'read': int(fields['rchar']), 'written': int(fields['wchar'])}
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _write_bench_file(path, size, rng):
+    """写入可复现的伪随机内容: 每个文件一个随机块, 按 MB 重复并写入块序号"""
+    block = bytearray(rng.randbytes(min(size, 1024 * 1024)))
+    with open(path, 'wb') as f:
+        written, n = 0, 0
+        while written < size:
+            block[:8] = n.to_bytes(8, 'little')
+            part = block[:size - written] if size - written < len(block) else block
+            f.write(part)
+            written += len(part)
+            n += 1
+
+def make_bench_corpus(root, profiles=BENCH_DEFAULT_PROFILES, seed=0, scale=1.0):
+    """在 root 下生成基准测试语料 (相同 seed 与 scale 生成相同的目录树), 返回语料统计"""
+    root = Path(root)
+    corpus = {}
+    fingerprint = hashlib.blake2b(digest_size=16)
+    for profile in profiles:
+        spec = BENCH_PROFILES[profile]
+        rng = random.Random(f"{seed}-{profile}")
+        written = []
+        total = 0
+        for i in range(spec['files']):
+            depth = rng.randint(0, spec['depth'])
+            folder = root / profile
+            for level in range(depth):
+                folder = folder / f"d{level}_{rng.randint(0, 3)}"
+            folder.mkdir(parents=True, exist_ok=True)
+            if written and rng.random() < spec['duplicates']:
+                # 重复内容: 一半与原文件同名 (不同子目录), 一半使用新文件名
+                original = rng.choice(written)
+                name = original.name if rng.random() < 0.5 else f"{profile}_{i:05d}.sav"
+                path = folder / name
+                if path == original:
+                    path = folder / f"{profile}_{i:05d}.sav"
+                shutil.copyfile(original, path)
+            else:
+                size = max(1, int(rng.randint(spec['min_size'], spec['max_size']) * scale))
+                path = folder / f"{profile}_{i:05d}.sav"
+                _write_bench_file(path, size, rng)
+            written.append(path)
+            size = path.stat().st_size
+            total += size
+            fingerprint.update(f"{path.relative_to(root).as_posix()}:{size}\n".encode('utf-8'))
+        corpus[profile] = {'files': len(written), 'bytes': total}
+    return {'profiles': corpus, 'fingerprint': fingerprint.hexdigest()}
+
+def _bench_step(op, func, count_files):
+    """运行一个操作并统计耗时与读写字节数"""
+    io_before = io_counters()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    io_after = io_counters()
+    files = count_files(result)
+    step = {'op': op, 'seconds': round(seconds, 4), 'files': files,
+            'files_per_s': round(files / seconds, 1) if seconds > 0 else None}
+    if io_before and io_after:
+        step['bytes_read'] = io_after['read'] - io_before['read']
+        step['bytes_written'] = io_after['written'] - io_before['written']
+    if 'metrics' in result:
+        step['phases'] = result['metrics']['phases']
+        step['hash_cache'] = result['metrics']['hash_cache']
+    return step
+
+def run_benchmark_suite(profiles=BENCH_DEFAULT_PROFILES, seed=0, scale=1.0, repeat=1, keep=False):
+    """在临时目录中生成语料, 依次运行 install / status / restore / clean 并计时
+
+    每轮使用全新的语料与目录 (相同 seed 生成相同内容); 多轮时每个操作取最快一次,
+    便于在不同版本间比较
+    """
+    saved_dirs = (SCRIPT_DIR, TARGET_DIR, BACKUP_DIR)
+    runs = []
+    corpus = None
+    try:
+        for _ in range(repeat):
+            root = Path(tempfile.mkdtemp(prefix='sav_bench_'))
+            try:
+                source_dir, target_dir = root / 'source', root / 'Saved' / 'SaveGames'
+                corpus = make_bench_corpus(source_dir, profiles, seed, scale)
+                configure(source_dir, target_dir, source_dir / '_SAV_BACKUP')
+                runs.append([
+                    _bench_step('install', api_install, lambda r: r['stats']['total']),
+                    _bench_step('status', api_status, lambda r: len(r['target']['files'])),
+                    _bench_step('restore', api_restore, lambda r: r['restored']),
+                    _bench_step('clean', api_clean, lambda r: r['deleted']),
+                ])
+                if _purge_thread is not None:
+                    _purge_thread.join()
+            finally:
+                configure(*saved_dirs)
+                if keep:
+                    print(f"  基准测试目录已保留: {root}", file=sys.stderr)
+                else:
+                    shutil.rmtree(root, ignore_errors=True)
+    finally:
+        configure(*saved_dirs)
+
+    steps = []
+    for samples in zip(*runs):
+        best = dict(min(samples, key=lambda step: step['seconds']))
+        best['samples'] = [step['seconds'] for step in samples]
+        steps.append(best)
+    return {
+        'tool': 'SAV Manager v2.0',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': {
+            'seed': seed,
+            'scale': scale,
+            'repeat': repeat,
+            'hash_algorithm': HASH_ALGORITHM,
+            'hash_workers': HASH_WORKERS,
+            'copy_workers': COPY_WORKERS,
+            'backup_format': BACKUP_FORMAT,
+        },
+        'corpus': corpus,
+        'steps': steps,
+    }
+
+def format_size(size):
+    """格式化字节数"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.1f} {unit}" if unit != 'B' else f"{size} B"
+        size /= 1024
 
 def print_header():
     """打印标题"""
@@ -96,21 +1627,796 @@ def print_menu():
   │                                                                       │
   │     {Color.WHITE}[4] 清理目录{Color.CYAN}  -  删除游戏目录中的所有存档文件                 │
   │                                                                       │
+  │     {Color.WHITE}[5] 校验安装{Color.CYAN}  -  对照安装清单检查游戏目录中的存档             │
+  │                                                                       │
   │     {Color.WHITE}[0] 退出程序{Color.CYAN}                                                  │
   │                                                                       │
   └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
 """)
 
+def list_sav_dir(path, exclude_dirs=None, ignore=()):
+    """列出单个目录: 返回 (子目录路径列表, [(.sav 文件路径, stat)])"""
+    exclude_dirs = SCAN_EXCLUDE_DIRS if exclude_dirs is None else exclude_dirs
+    subdirs, files = [], []
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return subdirs, files
+    with it:
+        for entry in it:
+            name = entry.name
+            if ignore and any(fnmatch.fnmatch(name, pat) for pat in ignore):
+                continue
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if name not in exclude_dirs:
+                        subdirs.append(entry.path)
+                elif name.lower().endswith('.sav') and entry.is_file():
+                    files.append((Path(entry.path), entry.stat()))
+            except OSError:
+                continue
+    return subdirs, files
+
+def scan_sav_files(directory, exclude_dirs=None, max_depth=None, ignore=()):
+    """逐个返回目录下的 .sav 文件 (路径, stat)
+
+    排除的子目录在进入前剪枝; max_depth 为子目录层数上限 (0 表示只扫描当前目录);
+    ignore 为文件名/目录名通配符列表
+    """
+    stack = [(os.fspath(directory), 0)]
+    while stack:
+        path, depth = stack.pop()
+        subdirs, files = list_sav_dir(path, exclude_dirs, ignore)
+        yield from files
+        if max_depth is None or depth < max_depth:
+            # 保持与 os.walk 相同的先后顺序
+            stack.extend((d, depth + 1) for d in reversed(subdirs))
+
 def get_sav_files(directory, exclude_backup=True):
     """获取目录下的所有.sav文件"""
-    sav_files = []
-    for root, dirs, files in os.walk(directory):
-        if exclude_backup and '_SAV_BACKUP' in root:
+    exclude_dirs = SCAN_EXCLUDE_DIRS if exclude_backup else ()
+    return [p for p, _ in scan_sav_files(directory, exclude_dirs)]
+
+class SourceIndex:
+    """安装前的源文件索引: 按目标文件名和内容分组
+
+    同名文件按 policy 选出一个安装, 其余记为冲突; 已安装文件 (清单中记录的其他来源)
+    同样参与比较, 之前的选择不会被留在源目录中的落选文件覆盖; 内容相同的文件 (先按大小分组,
+    只对大小相同的文件计算哈希) 合并为一组, 每份内容只读取和复制一次
+    """
+
+    def __init__(self, policy=None):
+        self.policy = policy or NAME_CONFLICT_POLICY
+        if self.policy not in NAME_CONFLICT_POLICIES:
+            raise ValueError(f"未知的同名冲突策略: {self.policy}")
+        self.by_name = {}
+        self.by_digest = {}
+        self.bytes_read = 0
+
+    def add(self, item):
+        self.by_name.setdefault(os.path.normcase(item['name']), []).append(item)
+
+    def _rank(self, item):
+        st = item['st']
+        if self.policy == 'newest':
+            return (-st.st_mtime_ns, item['seq'])
+        if self.policy == 'largest':
+            return (-st.st_size, item['seq'])
+        return (item['seq'],)
+
+    def _rank_installed(self, entry):
+        # 复制时保留了修改时间, 清单中的大小和修改时间即为来源文件的; 相同时保留已安装的文件
+        if self.policy == 'newest':
+            return (-entry['mtime_ns'], -1)
+        if self.policy == 'largest':
+            return (-entry['size'], -1)
+        return (-1,)
+
+    def _hash(self, items, workers):
+        """为大小相同的候选文件补齐哈希 (优先使用缓存)"""
+        missing = []
+        for item in items:
+            if not item.get('digest'):
+                item['digest'] = peek_file_hash(item['source'], st=item['st'])
+                if not item['digest']:
+                    missing.append(item)
+        for item, digest in zip(missing, hash_files([i['source'] for i in missing], workers)):
+            item['digest'] = digest
+            self.bytes_read += item['st'].st_size
+
+    def build(self, workers=None, installed=None):
+        """返回 (需要安装的文件, 同名冲突未安装的文件), 内容相同的文件挂在 item['aliases'] 下
+
+        installed 为 {文件名: 清单条目}, 只包含来源不在本次候选中且之后未被修改的已安装文件
+        """
+        installed = installed or {}
+        winners, conflicts, candidates = [], [], []
+        for key, items in self.by_name.items():
+            items.sort(key=self._rank)
+            entry = installed.get(key)
+            if entry and self._rank_installed(entry) < self._rank(items[0]):
+                # 已安装的文件仍按策略优先
+                for item in items:
+                    item['shadowed_by'] = entry['source']
+                    item['reason'] = 'conflict'
+                    conflicts.append(item)
+                continue
+            winner = items[0]
+            winners.append(winner)
+            for item in items[1:]:
+                item['shadowed_by'] = str(winner['source'])
+                if item['st'].st_size == winner['st'].st_size:
+                    candidates.append(item)
+                else:
+                    item['reason'] = 'conflict'
+                    conflicts.append(item)
+
+        by_size = {}
+        for item in winners:
+            by_size.setdefault(item['st'].st_size, []).append(item)
+        for item in candidates:
+            by_size[item['st'].st_size].append(item)
+        self._hash([i for group in by_size.values() if len(group) > 1 for i in group], workers)
+
+        leaders = []
+        for item in sorted(winners, key=lambda i: i['seq']):
+            item['aliases'] = []
+            group = self.by_digest.setdefault(item['digest'], []) if item.get('digest') else []
+            if group:
+                group[0]['aliases'].append(item)
+                item['duplicate_of'] = str(group[0]['source'])
+            else:
+                leaders.append(item)
+            group.append(item)
+        for item in candidates:
+            # 与选中文件同名且内容相同: 随选中文件一起处理, 无需再次复制
+            winner = self.by_name[os.path.normcase(item['name'])][0]
+            if item['digest'] and item['digest'] == winner.get('digest'):
+                leader = self.by_digest[item['digest']][0]
+                del item['shadowed_by']
+                item['duplicate_of'] = str(leader['source'])
+                leader['aliases'].append(item)
+            else:
+                item['reason'] = 'conflict'
+                conflicts.append(item)
+        return leaders, conflicts
+
+class InstallPipeline:
+    """流水线安装: 扫描 -> 哈希比较 -> 复制 -> 备份
+
+    各阶段在独立线程中运行, 通过有界队列衔接, 使磁盘读写与哈希计算重叠进行
+    """
+
+    _DONE = object()
+
+    def __init__(self, source_dir, target_dir, store, manifest=None, journal=None,
+                 hash_workers=None, copy_workers=None, queue_size=None, files=None, policy=None):
+        self.source_dir = Path(source_dir)
+        self.files = files
+        self.policy = policy
+        # target_dir 可以是多个游戏目录 (列表), 每个源文件只读取一次, 同时写入所有目录
+        if isinstance(target_dir, (list, tuple)):
+            self.target_dirs = [Path(d) for d in target_dir]
+        else:
+            self.target_dirs = [Path(target_dir)]
+        self.target_dir = self.target_dirs[0]
+        self.store = store
+        self.manifest = manifest
+        self.journal = journal
+        self.batch = None
+        self.completed = {}
+        self.hash_workers = hash_workers or HASH_WORKERS
+        self.copy_workers = copy_workers or COPY_WORKERS
+        queue_size = queue_size or PIPELINE_QUEUE_SIZE
+        self.compare_q = queue.Queue(queue_size)
+        self.copy_q = queue.Queue(queue_size)
+        self.backup_q = queue.Queue(queue_size)
+        self.lock = threading.Lock()
+        self.results = []
+        self.stats = {
+            'total': 0,
+            'done': 0,
+            'copied': 0,
+            'skipped': 0,
+            'backed': 0,
+            'failed': 0,
+            'bytes_read': 0,
+            'bytes_copied': 0,
+            'bytes_avoided': 0,
+            'elapsed': 0.0,
+        }
+        self.start_time = None
+        self.metrics = None
+        self.report = None
+
+    def _count(self, **deltas):
+        with self.lock:
+            for key, value in deltas.items():
+                self.stats[key] += value
+
+    def _finish(self, item, action, error=None):
+        item['action'] = action
+        if error:
+            item['error'] = error
+        with self.lock:
+            self.results.append(item)
+            self.stats['done'] += 1
+            self.stats[action] += 1
+
+    # 阶段1: 扫描并建立索引
+    def _scan(self):
+        start = time.perf_counter()
+        index = SourceIndex(self.policy)
+        # 指定了文件列表 [(路径, stat)] 时只处理这些文件, 否则扫描源目录
+        files = self.files if self.files is not None else scan_sav_files(self.source_dir)
+        for seq, (path, st) in enumerate(files):
+            index.add({'seq': seq, 'source': path, 'st': st, 'name': path.name,
+                       'target': self.target_dir / path.name, 'targets': {}, 'timings': {}, 'bytes': {}})
+            self._count(total=1)
+        # 复制开始前确定每个目标文件名的来源, 以及内容相同的文件分组
+        leaders, conflicts = index.build(self.hash_workers, self._installed(index))
+        self._count(bytes_read=index.bytes_read)
+        record_phase('scan', time.perf_counter() - start)
+        for item in conflicts:
+            self._finish(item, 'skipped')
+        for item in leaders:
+            self.compare_q.put(item)
+
+    def _installed(self, index):
+        """候选文件名在游戏目录中的已安装文件: 来源为本次候选以外的文件且之后未被修改"""
+        installed = {}
+        if not self.manifest:
+            return installed
+        entries = self.manifest.entries(self.target_dir)
+        for key, items in index.by_name.items():
+            entry = entries.get(items[0]['name'])
+            if not entry or not entry.get('source') or entry['source'] in (str(i['source']) for i in items):
+                continue
+            try:
+                st = os.stat(self.target_dir / items[0]['name'])
+            except OSError:
+                continue
+            if self.manifest.lookup(self.target_dir, items[0]['name'], st):
+                installed[key] = entry
+        return installed
+
+    # 阶段2: 哈希比较
+    def _journal_step(self, item, step, **info):
+        if self.journal:
+            self.journal.step(self.batch, str(item['source']), step, **info)
+
+    def _target_matches(self, item, target_dir):
+        """判断某个游戏目录中的同名文件是否与源文件相同, 返回 (是否相同, 判定依据)"""
+        target = target_dir / item['name']
+        try:
+            target_st = os.stat(target)
+        except OSError:
+            return False, None
+        # 清单记录的目标文件未变化: 直接与清单中的哈希比较, 不读取目标文件
+        entry = self.manifest.lookup(target_dir, item['name'], target_st) if self.manifest else None
+        if entry and entry['size'] != item['st'].st_size:
+            self._count(bytes_avoided=entry['size'])
+            return False, 'size'
+        if entry and item['digest'] and entry.get('algorithm') == HASH_ALGORITHM:
+            self._count(bytes_avoided=entry['size'])
+            if entry['digest'] == item['digest']:
+                return True, 'manifest'
+            return False, 'hash'
+        same, reason, bytes_read, avoided = compare_files(item['source'], target, item['digest'])
+        self._count(bytes_read=bytes_read, bytes_avoided=avoided)
+        if same:
+            if not item['digest']:
+                item['digest'] = get_file_hash(item['source'], st=item['st'])
+                self._count(bytes_read=item['st'].st_size)
+            if self.manifest:
+                self.manifest.record(target_dir, item['name'], item['digest'], item['source'])
+        elif reason == 'hash' and not item['digest']:
+            # 完整比较时已计算并缓存了源文件哈希
+            item['digest'] = peek_file_hash(item['source'], st=item['st'])
+        return same, reason
+
+    def _plan_targets(self, item):
+        """逐个游戏目录比较, 将需要写入的目录记入 item['copy_to']"""
+        item['copy_to'] = []
+        for target_dir in self.target_dirs:
+            same, reason = self._target_matches(item, target_dir)
+            item['targets'][str(target_dir)] = 'skipped' if same else 'copied'
+            if not same:
+                item['copy_to'].append(target_dir)
+                if reason and 'reason' not in item:
+                    item['reason'] = reason
+        if not item['copy_to'] and len(self.target_dirs) == 1:
+            item['reason'] = reason
+        return bool(item['copy_to'])
+
+    def _compare_one(self, item):
+        """返回 True 表示需要复制; item['group'] 为本组中需要安装的文件"""
+        item['group'] = []
+        if self._resumed(item):
+            item['group'].append(item)
+        else:
+            item['digest'] = item.get('digest') or peek_file_hash(item['source'], st=item['st'])
+            if self._plan_targets(item):
+                item['group'].append(item)
+            else:
+                self._finish(item, 'skipped')
+        # 内容相同的其他文件: 哈希已知, 与本文件一起复制
+        for alias in item['aliases']:
+            if self._resumed(alias) or self._plan_targets(alias):
+                item['group'].append(alias)
+            else:
+                self._finish(alias, 'skipped')
+        return bool(item['group'])
+
+    def _resumed(self, item):
+        """断点续装: 上次已复制完成 (目标文件内容与日志一致) 的文件直接进入备份阶段"""
+        copy = self.completed.get(str(item['source']), {}).get('copy')
+        if not copy or copy.get('size') != item['st'].st_size:
+            return False
+        targets = copy.get('targets') or [str(d / item['name']) for d in self.target_dirs]
+        # 日志在替换目标文件之前写入, 中断时目标可能仍是旧文件: 需核对哈希
+        if not all(get_file_hash(target) == copy['digest'] for target in targets):
+            return False
+        item.update(digest=copy['digest'], method='resumed', resumed=True, copy_to=[])
+        if self.manifest:
+            for target in targets:
+                self.manifest.record(Path(target).parent, item['name'], copy['digest'], item['source'])
+        return True
+
+    # 阶段3: 复制
+    def _copy_one(self, item):
+        """返回 True 表示复制成功"""
+        # 同一份内容的所有目标文件由一次读取写出
+        targets = list(dict.fromkeys(d / member['name'] for member in item['group'] for d in member['copy_to']))
+
+        def journal_copy(digest):
+            # 替换目标文件之前记录并落盘, 之后任何时刻中断 (包括断电), 续装都能据此完成备份
+            for member in item['group']:
+                if member['copy_to']:
+                    self._journal_step(member, 'copy', sync=True, digest=digest, size=member['st'].st_size,
+                                       name=member['name'], targets=[str(d / member['name']) for d in member['copy_to']])
+
+        if targets:
+            digest, method = copy_to_many(item['source'], targets, item['digest'], before_replace=journal_copy)
+            item['digest'] = digest
+            item['method'] = method
+            item['bytes']['copy'] = item['st'].st_size * len(targets)
+            self._count(bytes_copied=item['bytes']['copy'])
+            if 'stream' in method:
+                self._count(bytes_read=item['st'].st_size)
+        for member in item['group']:
+            member['digest'] = item['digest']
+            member.setdefault('method', item.get('method'))
+            if self.manifest:
+                for target_dir in member['copy_to']:
+                    self.manifest.record(target_dir, member['name'], item['digest'], member['source'])
+        return True
+
+    # 阶段4: 备份
+    def _backup_one(self, item):
+        item['bytes']['backup'] = sum(member['st'].st_size for member in item['group'])
+        for member in item['group']:
+            try:
+                # 索引在批次结束时统一写回
+                member['backup_stored'] = self.store.add(member['source'], member['name'], item['digest'], save=False)
+                self._count(backed=1)
+                self._journal_step(member, 'backup')
+            except Exception as e:
+                member['backup_error'] = str(e)
+            self._finish(member, 'copied')
+
+    def _worker(self, in_q, handle, out_q=None, phase=None):
+        while True:
+            item = in_q.get()
+            if item is self._DONE:
+                return
+            start = time.perf_counter()
+            try:
+                ok = handle(item)
+                seconds = time.perf_counter() - start
+                item['timings'][phase] = round(seconds, 6)
+                record_phase(phase, seconds, item['bytes'].get(phase, 0))
+                if ok and out_q is not None:
+                    out_q.put(item)
+            except Exception as e:
+                # 未完成的文件 (含内容相同的分组成员) 全部记为失败
+                members = item['group'] if 'group' in item else [item] + item['aliases']
+                for member in members:
+                    if 'action' not in member:
+                        self._finish(member, 'failed', str(e))
+
+    def snapshot(self):
+        """当前进度快照"""
+        with self.lock:
+            stats = dict(self.stats)
+        stats['elapsed'] = time.perf_counter() - self.start_time
+        return stats
+
+    def _wait(self, threads, on_progress, interval):
+        for t in threads:
+            while t.is_alive():
+                t.join(interval)
+                if on_progress:
+                    on_progress(self.snapshot())
+
+    @staticmethod
+    def _start(count, target, *args):
+        threads = [threading.Thread(target=profiled(target), args=args, daemon=True) for _ in range(count)]
+        for t in threads:
+            t.start()
+        return threads
+
+    def resume(self, pending):
+        """从未完成的批次继续: 已完成的步骤不再重复"""
+        self.batch = pending['batch']
+        self.completed = pending['done']
+        # 源文件已移入备份库但索引未写入的文件 (索引在批次结束时才写回): 补写索引
+        for key, steps in self.completed.items():
+            copy = steps.get('copy')
+            if copy and not os.path.exists(key) and self.store.has_object(copy['digest']) and \
+                    not any(v['digest'] == copy['digest'] for v in self.store.versions(copy['name'])):
+                fmt = 'blob' if self.store.object_path(copy['digest']).exists() else 'chunked'
+                self.store.record_version(copy['name'], copy['digest'], copy['size'], fmt, save=False)
+                if 'backup' not in steps:
+                    self.journal.step(self.batch, key, 'backup')
+        self.store.save()
+
+    def run(self, on_progress=None, interval=0.5):
+        """运行流水线, 返回按扫描顺序排列的处理结果"""
+        self.start_time = time.perf_counter()
+        if self.journal and self.batch is None:
+            self.batch = self.journal.begin('install', {
+                'source': str(self.source_dir),
+                'target': str(self.target_dir),
+                'targets': [str(d) for d in self.target_dirs],
+                'backup': str(self.store.backup_dir),
+            })
+        self.metrics = begin_metrics('install')
+        scanner = self._start(1, self._scan)
+        comparers = self._start(self.hash_workers, self._worker, self.compare_q, self._compare_one, self.copy_q, 'compare')
+        copiers = self._start(self.copy_workers, self._worker, self.copy_q, self._copy_one, self.backup_q, 'copy')
+        backers = self._start(1, self._worker, self.backup_q, self._backup_one, None, 'backup')
+
+        # 上游阶段结束后依次通知下游阶段退出
+        stages = (
+            (scanner, self.compare_q, comparers),
+            (comparers, self.copy_q, copiers),
+            (copiers, self.backup_q, backers),
+        )
+        for upstream, next_q, downstream in stages:
+            self._wait(upstream, on_progress, interval)
+            for _ in downstream:
+                next_q.put(self._DONE)
+        self._wait(backers, on_progress, interval)
+
+        self.store.save()
+        if self.manifest:
+            self.manifest.save()
+        if self.journal:
+            self.journal.commit(self.batch)
+        self.stats['elapsed'] = time.perf_counter() - self.start_time
+        if on_progress:
+            on_progress(self.snapshot())
+        self.results.sort(key=lambda item: item['seq'])
+        files = [dict(_item_record(item), bytes=item['bytes'], seconds=item['timings']) for item in self.results]
+        self.report = end_metrics(self.metrics, files, stats=dict(self.stats))
+        return self.results
+
+class SavWatcher:
+    """监视源目录, 新增或修改的 .sav 文件写入完成后自动安装
+
+    每次轮询只检查各目录自身的修改时间, 仅重新列出发生变化的目录;
+    等待中的文件单独 stat, 大小和修改时间稳定 debounce 秒后才安装
+    """
+
+    def __init__(self, source_dir, target_dir, store, manifest=None, journal=None,
+                 interval=None, debounce=None, full_rescan=None):
+        self.source_dir = Path(source_dir)
+        self.target_dir = Path(target_dir)
+        self.store = store
+        self.manifest = manifest
+        self.journal = journal
+        self.interval = WATCH_INTERVAL if interval is None else interval
+        self.debounce = WATCH_DEBOUNCE if debounce is None else debounce
+        self.full_rescan = WATCH_FULL_RESCAN if full_rescan is None else full_rescan
+        self.dirs = {}      # 目录 -> 修改时间
+        self.files = {}     # 文件 -> (大小, 修改时间), 已处理过的状态
+        self.pending = {}   # 文件 -> ((大小, 修改时间), 首次观察到该状态的时间)
+        self.last_full_scan = 0.0
+
+    @staticmethod
+    def _sig(st):
+        return (st.st_size, st.st_mtime_ns)
+
+    def _list(self, directory, recursive):
+        """列出目录, 记录目录修改时间, 新文件/变化的文件加入等待队列, 移除已不在目录中的文件记录"""
+        stack = [directory]
+        listed, seen = set(), set()
+        while stack:
+            path = stack.pop()
+            try:
+                self.dirs[path] = os.stat(path).st_mtime_ns
+            except OSError:
+                self._forget(path)
+                continue
+            subdirs, files = list_sav_dir(path)
+            listed.add(path)
+            for sub in subdirs:
+                if recursive or sub not in self.dirs:
+                    stack.append(sub)
+            now = time.monotonic()
+            for file_path, st in files:
+                key = os.fspath(file_path)
+                seen.add(key)
+                sig = self._sig(st)
+                if self.files.get(key) != sig and key not in self.pending:
+                    self.pending[key] = (sig, now)
+        # 已移走的文件: 以后以相同状态重新出现时仍需安装
+        for table in (self.files, self.pending):
+            for key in [k for k in table if k not in seen and os.path.dirname(k) in listed]:
+                del table[key]
+
+    def _forget(self, directory):
+        """目录已删除: 移除其下的所有记录"""
+        prefix = directory + os.sep
+        for table in (self.dirs, self.files, self.pending):
+            for key in [k for k in table if k == directory or k.startswith(prefix)]:
+                del table[key]
+
+    def snapshot(self, mark_known=True):
+        """完整扫描一次; mark_known 为 True 时现有文件视为已处理 (不安装)"""
+        self._list(os.fspath(self.source_dir), recursive=True)
+        if mark_known:
+            for key, (sig, _) in self.pending.items():
+                self.files[key] = sig
+            self.pending.clear()
+        self.last_full_scan = time.monotonic()
+
+    def poll(self):
+        """检查一次变化, 返回写入已完成, 可以安装的 [(路径, stat)]"""
+        now = time.monotonic()
+        if now - self.last_full_scan >= self.full_rescan:
+            self._list(os.fspath(self.source_dir), recursive=True)
+            self.last_full_scan = now
+        else:
+            for path, mtime in list(self.dirs.items()):
+                try:
+                    if os.stat(path).st_mtime_ns != mtime:
+                        self._list(path, recursive=False)
+                except OSError:
+                    self._forget(path)
+
+        ready = []
+        for key, (sig, since) in list(self.pending.items()):
+            try:
+                st = os.stat(key)
+            except OSError:
+                # 已被删除或改名
+                del self.pending[key]
+                self.files.pop(key, None)
+                continue
+            if self._sig(st) != sig:
+                self.pending[key] = (self._sig(st), now)
+            elif now - since >= self.debounce:
+                del self.pending[key]
+                self.files[key] = sig
+                ready.append((Path(key), st))
+        return ready
+
+    def install(self, files):
+        """安装指定文件, 返回流水线结果"""
+        pipeline = InstallPipeline(self.source_dir, self.target_dir, self.store,
+                                   self.manifest, self.journal, files=files)
+        results = pipeline.run()
+        get_hash_cache().save()
+        return results
+
+    def run(self, on_install=None, stop_event=None, install_existing=True):
+        """持续监视直到 stop_event 被设置 (或 KeyboardInterrupt)"""
+        self.target_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot(mark_known=not install_existing)
+        # 启动时已存在的文件同样需要经过去抖, 避免安装正在写入的文件
+        while stop_event is None or not stop_event.is_set():
+            ready = self.poll()
+            if ready:
+                results = self.install(ready)
+                if on_install:
+                    on_install(results)
+            if stop_event is not None:
+                stop_event.wait(self.interval)
+            else:
+                time.sleep(self.interval)
+
+def restore_files(store, selections, dest_dir, journal=None, resume=None, consume=False, workers=None):
+    """按 [(文件名, 版本序号)] 并行恢复备份到 dest_dir, 返回每个文件的结果 (顺序与输入一致)
+
+    目标位置已有内容相同的文件时跳过; consume=True 时恢复后从备份库移除该版本
+    """
+    dest_dir = Path(dest_dir)
+    metrics = begin_metrics('restore')
+    if resume:
+        batch, done = resume['batch'], resume['done']
+        digests = resume['params'].get('digests', {})
+    else:
+        batch, done = None, {}
+        # 按内容摘要记录所选版本: consume 移除版本后, 版本序号会指向其他版本
+        digests = {}
+        for name, version in selections:
+            try:
+                entry = store.names[name][version]
+            except (KeyError, IndexError):
+                continue
+            digests[name] = [entry['digest'], entry.get('algorithm')]
+        if journal:
+            batch = journal.begin('restore', {'dest': str(dest_dir), 'selections': selections, 'consume': consume,
+                                              'backup': str(store.backup_dir), 'digests': digests})
+
+    def restore_one(selection):
+        name, version = selection
+        if name in done:
+            return {'name': name, 'resumed': True}
+        start = time.perf_counter()
+        try:
+            dest_file = dest_dir / name
+            if resume and name in digests:
+                digest, algorithm = digests[name]
+                versions = store.names.get(name, [])
+                version = next((i for i in range(len(versions) - 1, -1, -1) if versions[i]['digest'] == digest), None)
+                if version is None:
+                    # 中断前已恢复并从备份库移除该版本
+                    if dest_file.exists() and get_file_hash(dest_file, algorithm=algorithm) == digest:
+                        return {'name': name, 'resumed': True}
+                    raise FileNotFoundError(f"备份中已没有该版本: {digest}")
+            entry = store.names[name][version]
+            # 比较哈希 (优先使用缓存), 内容相同则无需恢复
+            try:
+                st = os.stat(dest_file)
+            except OSError:
+                st = None
+            if st and st.st_size == entry['size'] and \
+                    get_file_hash(dest_file, algorithm=entry.get('algorithm'), st=st) == entry['digest']:
+                if consume:
+                    store.discard(name, entry)
+                result = {'name': name, 'entry': entry, 'skipped': True}
+            else:
+                entry, method = store.restore(name, dest_file, version, consume)
+                result = {'name': name, 'entry': entry, 'method': method}
+            seconds = time.perf_counter() - start
+            record_phase('restore', seconds, 0 if result.get('skipped') else entry['size'])
+            result['seconds'] = round(seconds, 6)
+            if journal:
+                journal.step(batch, name, 'restore')
+            return result
+        except Exception as e:
+            return {'name': name, 'error': str(e)}
+
+    workers = workers or RESTORE_WORKERS
+    if workers <= 1 or len(selections) <= 1:
+        results = [restore_one(sel) for sel in selections]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(selections))) as pool:
+            results = list(pool.map(restore_one, selections))
+    if journal:
+        journal.commit(batch)
+    end_metrics(metrics, [_restore_record(r) for r in results], dest=str(dest_dir),
+                restored=sum(1 for r in results if 'method' in r))
+    return results
+
+def _restore_record(result):
+    """恢复结果转为日志记录"""
+    record = {k: result[k] for k in ('name', 'method', 'skipped', 'resumed', 'error', 'seconds') if k in result}
+    if 'entry' in result:
+        record.update(digest=result['entry']['digest'], size=result['entry']['size'])
+    return record
+
+def match_backup_names(names, patterns):
+    """按文件名或通配符 (如 *night*.sav) 选择备份, 返回 (匹配的文件名, 没有匹配的模式)"""
+    names = sorted(names)
+    if not patterns:
+        return names, []
+    selected, unmatched = [], []
+    for pattern in patterns:
+        found = [name for name in names if fnmatch.fnmatch(name, pattern)]
+        if not found:
+            unmatched.append(pattern)
+        selected.extend(name for name in found if name not in selected)
+    return selected, unmatched
+
+def select_clean_files(target_dir, patterns=None, older_than=None, untracked=False, manifest=None):
+    """按条件选择游戏目录中的 .sav 文件: 通配符, 修改时间早于 older_than 天, 不在安装清单中"""
+    target_dir = Path(target_dir)
+    if not target_dir.exists():
+        return []
+    cutoff = time.time() - older_than * 86400 if older_than is not None else None
+    tracked = manifest.entries(target_dir) if untracked and manifest else {}
+    names = []
+    for f in sorted(target_dir.glob('*.sav')):
+        if patterns and not any(fnmatch.fnmatch(f.name, p) for p in patterns):
             continue
-        for file in files:
-            if file.lower().endswith('.sav'):
-                sav_files.append(Path(root) / file)
-    return sav_files
+        if cutoff is not None and f.stat().st_mtime >= cutoff:
+            continue
+        if untracked and f.name in tracked:
+            continue
+        names.append(f.name)
+    return names
+
+def clean_files(target_dir, names, manifest=None, journal=None, resume=None, quarantine=None, batch_dir=None):
+    """清理游戏目录中的指定文件, 返回每个文件的结果
+
+    指定 quarantine 时文件移入隔离区的批次目录 (batch_dir 为空时新建), 否则直接删除
+    """
+    target_dir = Path(target_dir)
+    metrics = begin_metrics('clean')
+    if quarantine and batch_dir is None:
+        batch_dir = quarantine.create(target_dir)
+    if resume:
+        batch, done = resume['batch'], resume['done']
+    else:
+        batch, done = None, {}
+        if journal:
+            batch = journal.begin('clean', {'target': str(target_dir), 'names': names,
+                                            'quarantine': str(batch_dir) if batch_dir else None})
+    results = []
+    entries = {}
+    for name in names:
+        if name in done:
+            results.append({'name': name, 'resumed': True})
+            continue
+        start = time.perf_counter()
+        try:
+            if quarantine:
+                quarantine.put(batch_dir, target_dir, name)
+            else:
+                (target_dir / name).unlink()
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            results.append({'name': name, 'error': str(e)})
+            continue
+        if manifest:
+            entry = manifest.remove(target_dir, name)
+            if entry:
+                entries[name] = entry
+        if journal:
+            journal.step(batch, name, 'delete')
+        record_phase('clean', time.perf_counter() - start)
+        results.append({'name': name})
+    if quarantine:
+        quarantine.finish(batch_dir, entries)
+    if manifest:
+        manifest.save()
+    if journal:
+        journal.commit(batch)
+    end_metrics(metrics, results, target=str(target_dir), quarantine=str(batch_dir) if batch_dir else None)
+    return results
+
+def resume_operation(pending):
+    """继续执行未完成的操作批次, 返回 (操作类型, 处理结果)"""
+    op, params = pending['op'], pending['params']
+    # 使用批次开始时的备份目录 (旧日志中没有记录时使用当前备份目录)
+    store = get_backup_store()
+    if params.get('backup') and Path(params['backup']).resolve() != store.backup_dir.resolve():
+        store = BackupStore(params['backup'])
+    if op == 'install':
+        pipeline = InstallPipeline(params['source'], params.get('targets') or params['target'],
+                                   store, get_manifest(), get_journal())
+        pipeline.resume(pending)
+        return op, pipeline.run()
+    if op == 'restore':
+        selections = [tuple(sel) for sel in params['selections']]
+        return op, restore_files(store, selections, params['dest'], get_journal(), pending,
+                                 params.get('consume', False))
+    if op == 'clean':
+        batch_dir = params.get('quarantine')
+        quarantine = None
+        if batch_dir:
+            quarantine = Quarantine(Path(batch_dir).parent)
+            Path(batch_dir).mkdir(parents=True, exist_ok=True)
+        return op, clean_files(params['target'], params['names'], get_manifest(), get_journal(), pending,
+                               quarantine, batch_dir)
+    # 无法识别的批次直接标记完成
+    get_journal().commit(pending['batch'])
+    return op, []
 
 def install_sav():
     """安装存档功能"""
@@ -140,15 +2446,24 @@ def install_sav():
     
     print()
     
-    # 步骤2：扫描文件
+    # 步骤2：流水线处理 (扫描 / 哈希比较 / 复制 / 备份 同时进行)
     print(f"  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐")
-    print(f"  │  【步骤 2/4】扫描 .sav 文件...                                      │")
+    print(f"  │  【步骤 2/4】扫描 .sav 文件并安装...                                │")
     print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
     
-    sav_files = get_sav_files(SCRIPT_DIR)
-    total = len(sav_files)
+    def show_progress(stats):
+        elapsed = stats['elapsed'] or 1e-9
+        speed = (stats['bytes_read'] + stats['bytes_copied']) / (1024 * 1024) / elapsed
+        print(f"\r  >> 已处理 {stats['done']}/{stats['total']} 个文件, "
+              f"已复制 {format_size(stats['bytes_copied'])}, {speed:.1f} MB/s    ", end='', flush=True)
+    
+    result = api_install(on_progress=show_progress)
+    stats = result['stats']
+    total = stats['total']
+    copied, skipped, backed = stats['copied'], stats['skipped'], stats['backed']
+    bytes_avoided = stats['bytes_avoided']
     
-    print(f"  {Color.GREEN}>> 发现 {total} 个存档文件{Color.RESET}\n")
+    print(f"\n\n  {Color.GREEN}>> 发现 {total} 个存档文件{Color.RESET}\n")
     
     if total == 0:
         print(f"  {Color.YELLOW}┌───────────────────────────────────────────────────────────────────────┐")
@@ -157,60 +2472,36 @@ def install_sav():
         input("  按回车键返回主菜单...")
         return
     
-    # 步骤3：计算哈希并处理
+    # 步骤3：处理结果
     print(f"  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐")
-    print(f"  │  【步骤 3/4】计算哈希值并检测重复...                                │")
+    print(f"  │  【步骤 3/4】哈希值与处理结果                                       │")
     print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
     
-    # 写入哈希日志
-    with open(HASH_LOG, 'w', encoding='utf-8') as log:
-        log.write(f"# SAV 文件哈希记录 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        log.write("# " + "=" * 60 + "\n\n")
-    
-    copied = 0
-    skipped = 0
-    backed = 0
+    reason_text = {'size': '大小不同', 'sample': '采样不同', 'hash': '哈希不同'}
     
-    for sav_file in sav_files:
-        filename = sav_file.name
-        print(f"  {Color.WHITE}>> 处理: {filename}{Color.RESET}")
-        
-        # 计算源文件哈希
-        source_hash = calculate_md5(sav_file)
-        print(f"     哈希值: {Color.CYAN}{source_hash}{Color.RESET}")
-        
-        # 记录哈希
-        with open(HASH_LOG, 'a', encoding='utf-8') as log:
-            log.write(f"[源文件] {filename} = {source_hash}\n")
-        
-        target_file = TARGET_DIR / filename
-        duplicate = False
+    for item in result['files']:
+        print(f"  {Color.WHITE}>> 处理: {item['name']}{Color.RESET}")
+        print(f"     哈希值: {Color.CYAN}{item.get('digest')}{Color.RESET}")
         
-        # 检查目标是否已存在同名文件
-        if target_file.exists():
-            target_hash = calculate_md5(target_file)
-            if source_hash == target_hash:
-                print(f"     状态: {Color.YELLOW}文件已存在且内容相同, 跳过{Color.RESET}")
-                skipped += 1
-                duplicate = True
+        if item['action'] == 'skipped' and item.get('reason') == 'conflict':
+            print(f"     状态: {Color.YELLOW}存在同名文件, 已选用 {item['shadowed_by']}, 跳过{Color.RESET}")
+        elif item['action'] == 'skipped' and item.get('reason') == 'manifest':
+            print(f"     状态: {Color.YELLOW}与安装清单一致, 跳过{Color.RESET}")
+        elif item['action'] == 'skipped':
+            print(f"     状态: {Color.YELLOW}文件已存在且内容相同, 跳过{Color.RESET}")
+        elif item['action'] == 'failed':
+            print(f"     状态: {Color.RED}操作失败 [FAIL] ({item['error']}){Color.RESET}")
+        else:
+            if item.get('reason'):
+                print(f"     状态: {Color.YELLOW}文件名相同但内容不同 ({reason_text[item['reason']]}), 已覆盖{Color.RESET}")
+            print(f"     状态: {Color.GREEN}复制成功 [OK] ({item['method']}){Color.RESET}")
+            if item.get('duplicate_of'):
+                print(f"     说明: {Color.CYAN}与 {item['duplicate_of']} 内容相同, 一次读取同时写入{Color.RESET}")
+            if 'backup_error' in item:
+                print(f"     备份: {Color.RED}备份失败 [FAIL] ({item['backup_error']}){Color.RESET}")
             else:
-                print(f"     状态: {Color.YELLOW}文件名相同但内容不同, 将覆盖{Color.RESET}")
-        
-        if not duplicate:
-            try:
-                # 复制文件到游戏目录
-                shutil.copy2(sav_file, target_file)
-                copied += 1
-                print(f"     状态: {Color.GREEN}复制成功 [OK]{Color.RESET}")
-                
-                # 创建备份
-                backup_file = BACKUP_DIR / f"{filename}.bak"
-                shutil.move(str(sav_file), str(backup_file))
-                backed += 1
-                print(f"     备份: {Color.GREEN}已备份原文件 [OK]{Color.RESET}")
-            except Exception as e:
-                print(f"     状态: {Color.RED}操作失败 [FAIL] ({e}){Color.RESET}")
-        
+                note = '' if item['backup_stored'] else ' (内容已存在)'
+                print(f"     备份: {Color.GREEN}已备份原文件 [OK]{note}{Color.RESET}")
         print()
     
     # 步骤4：显示结果
@@ -247,6 +2538,8 @@ def install_sav():
   │    * 成功复制:      {str(copied).ljust(4)} 个                                       │
   │    * 已存在跳过:    {str(skipped).ljust(4)} 个                                       │
   │    * 已备份:        {str(backed).ljust(4)} 个                                       │
+  │    * 分层比较节省:  {format_size(bytes_avoided).ljust(10)}                                     │
+  │    * 总耗时:        {f"{stats['elapsed']:.2f} s".ljust(10)}                                     │
   │                                                                       │
   │  【路径信息】                                                        │
   │    游戏目录: {str(TARGET_DIR)[:55]}
@@ -273,31 +2566,32 @@ def restore_backup():
         return
     
     # 获取备份文件
-    backup_files = list(BACKUP_DIR.glob('*.bak'))
+    store = get_backup_store()
+    names = sorted(store.names)
     
-    if not backup_files:
+    if not names:
         print(f"  {Color.YELLOW}┌───────────────────────────────────────────────────────────────────────┐")
         print(f"  │  【警告】备份目录中没有找到任何备份文件!                            │")
         print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
         input("  按回车键返回主菜单...")
         return
     
-    print(f"  >> 发现 {len(backup_files)} 个备份文件\n")
+    print(f"  >> 发现 {len(names)} 个备份文件\n")
     
     print(f"  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐")
     print(f"  │  【备份文件列表】                                                    │")
     print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
     
-    for idx, bak_file in enumerate(backup_files, 1):
-        # 去掉 .bak 后缀显示原文件名
-        original_name = bak_file.stem
-        print(f"    {idx}. {original_name}")
+    for idx, name in enumerate(names, 1):
+        print(f"    {idx}. {name}  ({len(store.versions(name))} 个版本)")
     
     print(f"""
   {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐
   │  【操作选项】                                                        │
   │                                                                       │
-  │    [A] 恢复所有备份文件                                               │
+  │    [A] 恢复所有备份文件 (最新版本)                                    │
+  │    [S] 选择部分文件恢复 (编号/范围/通配符, 如 1,3,5-7 或 *night*)     │
+  │    [V] 选择文件并恢复指定版本                                         │
   │    [B] 返回主菜单                                                     │
   │                                                                       │
   └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
@@ -306,30 +2600,80 @@ def restore_backup():
     choice = input("  请输入选项: ").strip().upper()
     
     if choice == 'A':
-        print(f"\n  >> 正在恢复所有备份文件...\n")
-        
-        restored = 0
-        for bak_file in backup_files:
-            original_name = bak_file.stem  # 去掉 .bak 后缀
-            print(f"  >> 恢复: {original_name}")
-            
+        selections = [(name, -1) for name in names]
+    elif choice == 'S':
+        selected = []
+        for token in input("  请输入编号或通配符: ").replace(',', ' ').split():
             try:
-                # 复制回原目录
-                target_path = SCRIPT_DIR / original_name
-                shutil.copy2(bak_file, target_path)
-                restored += 1
-                print(f"     状态: {Color.GREEN}恢复成功 [OK]{Color.RESET}")
-            except Exception as e:
-                print(f"     状态: {Color.RED}恢复失败 [FAIL] ({e}){Color.RESET}")
+                if '-' in token and not token.startswith('-'):
+                    first, last = (int(x) for x in token.split('-', 1))
+                    picked = names[first - 1:last]
+                else:
+                    picked = [names[int(token) - 1]]
+            except (ValueError, IndexError):
+                picked = match_backup_names(names, [token])[0]
+            selected.extend(name for name in picked if name not in selected)
+        if not selected:
+            print(f"\n  {Color.RED}>> 没有选中任何文件{Color.RESET}\n")
+            input("  按回车键返回主菜单...")
+            return
+        selections = [(name, -1) for name in selected]
+    elif choice == 'V':
+        try:
+            name = names[int(input("  请输入文件编号: ").strip()) - 1]
+        except (ValueError, IndexError):
+            print(f"\n  {Color.RED}>> 无效的编号{Color.RESET}\n")
+            input("  按回车键返回主菜单...")
+            return
+        versions = store.versions(name)
+        print()
+        for idx, v in enumerate(versions, 1):
+            print(f"    {idx}. {v['time']}  {format_size(v['size']).ljust(10)}  {v['digest'][:16]}")
+        answer = input(f"\n  请输入版本编号 [默认 {len(versions)} = 最新]: ").strip()
+        try:
+            version = int(answer) - 1 if answer else -1
+            versions[version]
+        except (ValueError, IndexError):
+            print(f"\n  {Color.RED}>> 无效的版本编号{Color.RESET}\n")
+            input("  按回车键返回主菜单...")
+            return
+        selections = [(name, version)]
+    else:
+        return
+    
+    consume = input("  恢复后是否从备份中移除这些版本? (y/N): ").strip().lower() == 'y'
+    
+    print(f"\n  >> 正在恢复备份文件...\n")
+    
+    restored = 0
+    restored_bytes = 0
+    start = time.perf_counter()
+    # 并行恢复到原目录, 内容相同的文件跳过
+    for result in restore_files(store, selections, SCRIPT_DIR, get_journal(), consume=consume):
+        print(f"  >> 恢复: {result['name']}")
         
-        print(f"""
+        if 'error' in result:
+            print(f"     状态: {Color.RED}恢复失败 [FAIL] ({result['error']}){Color.RESET}")
+        elif result.get('skipped'):
+            print(f"     状态: {Color.YELLOW}当前目录中的文件内容相同, 跳过{Color.RESET}")
+        else:
+            entry = result['entry']
+            restored += 1
+            restored_bytes += entry['size']
+            print(f"     版本: {entry['time']}")
+            print(f"     状态: {Color.GREEN}恢复成功 [OK] ({result['method']}){Color.RESET}")
+    
+    print(f"""
   {Color.GREEN}╔═══════════════════════════════════════════════════════════════════════╗
   ║                         [OK] 备份恢复完成!                            ║
   ║                                                                       ║
   ║               已恢复 {str(restored).ljust(4)} 个文件到当前目录                        ║
   ╚═══════════════════════════════════════════════════════════════════════╝{Color.RESET}
 """)
-        input("  按回车键返回主菜单...")
+    elapsed = time.perf_counter() - start
+    if restored_bytes and elapsed > 0:
+        print(f"  >> 恢复速度: {restored_bytes / (1024 * 1024) / elapsed:.1f} MB/s\n")
+    input("  按回车键返回主菜单...")
 
 def view_status():
     """查看状态功能"""
@@ -344,11 +2688,12 @@ def view_status():
     print(f"  │  {str(SCRIPT_DIR)[:65]}")
     print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
     
-    local_files = get_sav_files(SCRIPT_DIR)
-    if local_files:
-        for f in local_files:
-            print(f"    * {f.name}")
-        print(f"\n    共 {len(local_files)} 个存档文件\n")
+    local_count = 0
+    for f, _ in scan_sav_files(SCRIPT_DIR):
+        print(f"    * {f.name}")
+        local_count += 1
+    if local_count:
+        print(f"\n    共 {local_count} 个存档文件\n")
     else:
         print(f"    {Color.YELLOW}(无 .sav 文件){Color.RESET}\n")
     
@@ -361,13 +2706,13 @@ def view_status():
     if TARGET_DIR.exists():
         game_files = list(TARGET_DIR.glob('*.sav'))
         if game_files:
-            for f in game_files:
-                md5 = calculate_md5(f)
+            for f, digest in zip(game_files, hash_files(game_files)):
                 print(f"    * {f.name}")
-                print(f"      {Color.CYAN}MD5: {md5}{Color.RESET}")
+                print(f"      {Color.CYAN}{HASH_ALGORITHM.upper()}: {digest}{Color.RESET}")
             print(f"\n    共 {len(game_files)} 个存档文件\n")
         else:
             print(f"    {Color.YELLOW}(无 .sav 文件){Color.RESET}\n")
+        get_hash_cache().save()
     else:
         print(f"    {Color.YELLOW}(目录不存在){Color.RESET}\n")
     
@@ -378,11 +2723,14 @@ def view_status():
     print(f"  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}\n")
     
     if BACKUP_DIR.exists():
-        backup_files = list(BACKUP_DIR.glob('*.bak'))
-        if backup_files:
-            for f in backup_files:
-                print(f"    * {f.name}")
-            print(f"\n    共 {len(backup_files)} 个备份文件\n")
+        store = get_backup_store()
+        if store.names:
+            for name in sorted(store.names):
+                print(f"    * {name}  ({len(store.versions(name))} 个版本)")
+            stats = store.stats()
+            print(f"\n    共 {stats['names']} 个备份文件, {stats['versions']} 个版本")
+            print(f"    实际存储 {stats['objects']} 份内容, 占用 {format_size(stats['disk_bytes'])}"
+                  f" (原始 {format_size(stats['logical_bytes'])}, 去重率 {stats['dedup_ratio']}x)\n")
         else:
             print(f"    {Color.YELLOW}(无备份文件){Color.RESET}\n")
     else:
@@ -398,76 +2746,217 @@ def clean_game_dir():
     print(f"  ╚═══════════════════════════════════════════════════════════════════════╝{Color.RESET}\n")
     
     print(f"""  {Color.YELLOW}┌───────────────────────────────────────────────────────────────────────┐
-  │  【警告】此操作将删除游戏存档目录中的所有 .sav 文件!                 │
+  │  【警告】此操作将清理游戏存档目录中的 .sav 文件!                      │
   │                                                                       │
   │  目标目录: {str(TARGET_DIR)[:55]}
   │                                                                       │
   │  这通常用于解决因存档冲突导致游戏无法启动的问题。                     │
+  │  文件默认移入隔离区, {QUARANTINE_KEEP_DAYS} 天内可撤销。                                   │
   │                                                                       │
   └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
 """)
     
-    if not TARGET_DIR.exists():
-        print(f"  >> 游戏存档目录不存在, 无需清理\n")
-        input("  按回车键返回主菜单...")
-        return
-    
-    game_files = list(TARGET_DIR.glob('*.sav'))
+    quarantine = get_quarantine()
+    batches = quarantine.batches()
+    game_files = list(TARGET_DIR.glob('*.sav')) if TARGET_DIR.exists() else []
     
-    if not game_files:
+    if not game_files and not batches:
         print(f"  >> 游戏目录中没有 .sav 文件, 无需清理\n")
         input("  按回车键返回主菜单...")
         return
     
-    print(f"  >> 游戏目录中有 {len(game_files)} 个 .sav 文件\n")
+    print(f"  >> 游戏目录中有 {len(game_files)} 个 .sav 文件")
+    if batches:
+        last = batches[-1]
+        print(f"  >> 隔离区中有 {len(batches)} 次清理记录, 最近一次: {last['id']} ({last['files']} 个文件)")
+    print()
     
     print(f"""  {Color.YELLOW}┌───────────────────────────────────────────────────────────────────────┐
-  │  确认要删除这些文件吗?                                                │
+  │  请选择清理方式:                                                      │
   │                                                                       │
-  │    [Y] 是, 删除所有存档                                               │
-  │    [N] 否, 返回主菜单                                                 │
+  │    [Y] 清理所有存档 (移入隔离区, 可撤销)                              │
+  │    [F] 按条件清理 (文件名通配符 / 修改时间 / 不在安装清单中)          │
+  │    [D] 永久删除所有存档 (不可撤销)                                    │
+  │    [U] 撤销最近一次清理                                               │
+  │    [N] 返回主菜单                                                     │
   │                                                                       │
   └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
 """)
     
-    choice = input("  请输入选项 [Y/N]: ").strip().upper()
+    choice = input("  请输入选项: ").strip().upper()
     
-    if choice == 'Y':
-        print(f"\n  >> 正在删除...\n")
-        
-        deleted = 0
-        for f in game_files:
-            try:
-                f.unlink()
-                deleted += 1
-                print(f"    删除: {f.name} {Color.GREEN}[OK]{Color.RESET}")
-            except Exception as e:
-                print(f"    删除: {f.name} {Color.RED}[FAIL] ({e}){Color.RESET}")
-        
-        print(f"""
+    if choice == 'U':
+        try:
+            batch, results = quarantine.undo(manifest=get_manifest())
+        except FileNotFoundError as e:
+            print(f"\n  {Color.RED}>> {e}{Color.RESET}\n")
+            input("  按回车键返回主菜单...")
+            return
+        print(f"\n  >> 撤销清理: {batch}\n")
+        for result in results:
+            if 'error' in result:
+                print(f"    移回: {result['name']} {Color.RED}[FAIL] ({result['error']}){Color.RESET}")
+            else:
+                print(f"    移回: {result['name']} {Color.GREEN}[OK]{Color.RESET}")
+        print()
+        input("  按回车键返回主菜单...")
+        return
+    
+    if choice in ('Y', 'D'):
+        names = [f.name for f in game_files]
+    elif choice == 'F':
+        patterns = input("  文件名通配符 (空格分隔, 留空为全部): ").split()
+        days = input("  只清理多少天前修改的文件 (留空不限): ").strip()
+        untracked = input("  只清理不在安装清单中的文件? (y/N): ").strip().lower() == 'y'
+        try:
+            older_than = float(days) if days else None
+        except ValueError:
+            print(f"\n  {Color.RED}>> 无效的天数{Color.RESET}\n")
+            input("  按回车键返回主菜单...")
+            return
+        names = select_clean_files(TARGET_DIR, patterns, older_than, untracked, get_manifest())
+    else:
+        return
+    
+    if not names:
+        print(f"\n  >> 没有符合条件的文件, 无需清理\n")
+        input("  按回车键返回主菜单...")
+        return
+    
+    delete = choice == 'D'
+    print(f"\n  >> 正在{'删除' if delete else '移入隔离区'} ({len(names)} 个文件)...\n")
+    
+    deleted = 0
+    for result in clean_files(TARGET_DIR, names, get_manifest(), get_journal(),
+                              quarantine=None if delete else quarantine):
+        if 'error' in result:
+            print(f"    清理: {result['name']} {Color.RED}[FAIL] ({result['error']}){Color.RESET}")
+        else:
+            deleted += 1
+            print(f"    清理: {result['name']} {Color.GREEN}[OK]{Color.RESET}")
+    if not delete:
+        start_quarantine_purge()
+    
+    print(f"""
   {Color.GREEN}╔═══════════════════════════════════════════════════════════════════════╗
   ║                           [OK] 清理完成!                              ║
   ║                                                                       ║
-  ║               已删除 {str(deleted).ljust(4)} 个存档文件                               ║
+  ║               已清理 {str(deleted).ljust(4)} 个存档文件                               ║
   ║               现在可以重新安装正确的存档了                            ║
   ╚═══════════════════════════════════════════════════════════════════════╝{Color.RESET}
 """)
-        input("  按回车键返回主菜单...")
+    if not delete:
+        print(f"  >> 文件已移入隔离区: {quarantine.root}\n  >> 可在本菜单中选择 [U] 撤销\n")
+    input("  按回车键返回主菜单...")
+
+def verify_install():
+    """校验安装功能"""
+    clear_screen()
+    print(f"\n{Color.CYAN}  ╔═══════════════════════════════════════════════════════════════════════╗")
+    print(f"  ║                        校 验 安 装 状 态                              ║")
+    print(f"  ╚═══════════════════════════════════════════════════════════════════════╝{Color.RESET}\n")
+    
+    print(f"""  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐
+  │  【校验方式】                                                        │
+  │                                                                       │
+  │    [Q] 快速校验 - 只比较文件大小和修改时间                            │
+  │    [D] 深度校验 - 重新计算所有文件的哈希值                            │
+  │    [B] 返回主菜单                                                     │
+  │                                                                       │
+  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
+""")
+    
+    choice = input("  请输入选项: ").strip().upper()
+    if choice not in ('Q', 'D'):
+        return
+    
+    print(f"\n  >> 正在校验...\n")
+    report = get_manifest().verify(TARGET_DIR, deep=(choice == 'D'))
+    get_hash_cache().save()
+    
+    labels = (
+        ('ok', '一致', Color.GREEN),
+        ('changed', '已变化', Color.YELLOW),
+        ('missing', '已丢失', Color.RED),
+        ('untracked', '不在清单中', Color.YELLOW),
+    )
+    for key, label, color in labels:
+        for name in report[key]:
+            print(f"    {color}[{label}]{Color.RESET} {name}")
+    
+    print(f"""
+  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐
+  │  【校验结果】                                                        │
+  │                                                                       │
+  │    * 一致:          {str(len(report['ok'])).ljust(4)} 个                                       │
+  │    * 已变化:        {str(len(report['changed'])).ljust(4)} 个                                       │
+  │    * 已丢失:        {str(len(report['missing'])).ljust(4)} 个                                       │
+  │    * 不在清单中:    {str(len(report['untracked'])).ljust(4)} 个                                       │
+  │                                                                       │
+  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
+""")
+    input("  按回车键返回主菜单...")
+
+def check_pending_operations():
+    """启动时检查上次未完成的操作, 询问是否继续"""
+    pending = get_journal().pending()
+    if not pending:
+        return
+    
+    op_text = {'install': '安装存档', 'restore': '恢复备份', 'clean': '清理目录'}
+    clear_screen()
+    print(f"""
+  {Color.YELLOW}┌───────────────────────────────────────────────────────────────────────┐
+  │  【提示】检测到上次未完成的操作 (程序被中断)                          │
+  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
+""")
+    for p in pending:
+        print(f"    * {op_text.get(p['op'], p['op'])}: 已完成 {len(p['done'])} 个文件")
+    
+    print(f"""
+  {Color.CYAN}┌───────────────────────────────────────────────────────────────────────┐
+  │    [R] 继续未完成的操作 (跳过已完成的步骤)                            │
+  │    [D] 放弃, 不再提示                                                 │
+  └───────────────────────────────────────────────────────────────────────┘{Color.RESET}
+""")
+    
+    choice = input("  请输入选项 [R/D]: ").strip().upper()
+    for p in pending:
+        if choice == 'R':
+            op, results = resume_operation(p)
+            failed = sum(1 for r in results if r.get('error'))
+            print(f"  >> {op_text.get(op, op)}: 处理 {len(results)} 个文件, 失败 {failed} 个")
+        else:
+            get_journal().commit(p['batch'])
+    get_hash_cache().save()
+    input("\n  按回车键进入主菜单...")
+
+def setup_console():
+    """设置 Windows 控制台: UTF-8 编码, 标题, 窗口大小, ANSI 颜色支持"""
+    if sys.platform != 'win32':
+        return
+    import ctypes
+    kernel32 = ctypes.windll.kernel32
+    kernel32.SetConsoleOutputCP(65001)
+    kernel32.SetConsoleCP(65001)
+    kernel32.SetConsoleTitleW('Ready Or Not - SAV Manager v2.0')
+    kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+    os.system('mode con cols=78 lines=42')
+    os.system('color 0A')
 
 def main():
     """主函数"""
-    # 启用 Windows 终端的 ANSI 颜色支持
-    if sys.platform == 'win32':
-        import ctypes
-        kernel32 = ctypes.windll.kernel32
-        kernel32.SetConsoleMode(kernel32.GetStdHandle(-11), 7)
+    setup_console()
+    
+    check_pending_operations()
+    start_quarantine_purge()
     
     while True:
         clear_screen()
         print_header()
         print_menu()
         
-        choice = input("  请输入选项 [0-4]: ").strip()
+        choice = input("  请输入选项 [0-5]: ").strip()
         
         if choice == '1':
             install_sav()
@@ -477,6 +2966,8 @@ def main():
             view_status()
         elif choice == '4':
             clean_game_dir()
+        elif choice == '5':
+            verify_install()
         elif choice == '0':
             clear_screen()
             print(f"""
@@ -490,5 +2981,379 @@ def main():
 """)
             break
 
+# ============================================================
+# 非交互接口 (可导入调用, 结果为可序列化为 JSON 的字典)
+# ============================================================
+
+def configure(source_dir=None, target_dir=None, backup_dir=None):
+    """设置源目录 / 游戏目录 / 备份目录, 并重新加载相关的缓存与索引
+
+    哈希缓存, 安装清单, 操作日志和哈希日志保存在源目录中
+    """
+    global SCRIPT_DIR, TARGET_DIR, BACKUP_DIR, HASH_LOG, HASH_CACHE_FILE, MANIFEST_FILE, JOURNAL_FILE, OPS_LOG_FILE
+    global SCAN_EXCLUDE_DIRS, _hash_cache, _backup_store, _manifest, _journal, _quarantine, _ops_log
+    source_dir = Path(source_dir).resolve() if source_dir else SCRIPT_DIR
+    target_dir = Path(target_dir).resolve() if target_dir else TARGET_DIR
+    if backup_dir:
+        backup_dir = Path(backup_dir).resolve()
+    elif source_dir != SCRIPT_DIR:
+        backup_dir = source_dir / '_SAV_BACKUP'
+    else:
+        backup_dir = BACKUP_DIR
+    if (source_dir, target_dir, backup_dir) == (SCRIPT_DIR, TARGET_DIR, BACKUP_DIR):
+        return
+
+    if _hash_cache is not None:
+        _hash_cache.save()
+    SCRIPT_DIR, TARGET_DIR, BACKUP_DIR = source_dir, target_dir, backup_dir
+    HASH_LOG = SCRIPT_DIR / '_hash_log.txt'
+    HASH_CACHE_FILE = SCRIPT_DIR / '_hash_cache.json'
+    MANIFEST_FILE = SCRIPT_DIR / '_sav_manifest.json'
+    JOURNAL_FILE = SCRIPT_DIR / '_sav_journal.jsonl'
+    OPS_LOG_FILE = SCRIPT_DIR / '_sav_ops.jsonl'
+    if _ops_log is not None:
+        _ops_log.close()
+    # 备份目录位于源目录中时扫描需跳过
+    SCAN_EXCLUDE_DIRS = tuple(dict.fromkeys(('_SAV_BACKUP', BACKUP_DIR.name)))
+    _hash_cache = _backup_store = _manifest = _journal = _quarantine = _ops_log = None
+
+def _item_record(item):
+    """安装流水线结果转为可序列化的字典"""
+    record = {
+        'name': item['name'],
+        'source': str(item['source']),
+        'action': item.get('action'),
+        'digest': item.get('digest'),
+        'size': item['st'].st_size,
+    }
+    for key in ('reason', 'method', 'backup_stored', 'backup_error', 'error', 'duplicate_of', 'shadowed_by'):
+        if key in item:
+            record[key] = item[key]
+    if len(item.get('targets', {})) > 1:
+        record['targets'] = item['targets']
+    return record
+
+def api_install(source_dir=None, target_dir=None, backup_dir=None, on_progress=None):
+    """安装存档 (流水线), 返回统计与每个文件的处理结果
+
+    target_dir 可以是目录列表: 每个源文件只读取一次, 同时写入所有游戏目录
+    """
+    target_dirs = [Path(d).resolve() for d in target_dir] if isinstance(target_dir, (list, tuple)) else []
+    configure(source_dir, target_dirs[0] if target_dirs else target_dir, backup_dir)
+    target_dirs = target_dirs or [TARGET_DIR]
+    for d in target_dirs:
+        d.mkdir(parents=True, exist_ok=True)
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    pipeline = InstallPipeline(SCRIPT_DIR, target_dirs, get_backup_store(), get_manifest(), get_journal())
+    results = pipeline.run(on_progress)
+    get_hash_cache().save()
+    with open(HASH_LOG, 'w', encoding='utf-8') as log:
+        log.write(f"# SAV 文件哈希记录 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        log.write(f"# 哈希算法: {HASH_ALGORITHM}\n")
+        log.write("# " + "=" * 60 + "\n\n")
+        log.writelines(f"[源文件] {item['name']} = {item.get('digest')}\n" for item in results)
+    return {
+        'source': str(SCRIPT_DIR),
+        'target': str(TARGET_DIR),
+        'targets': [str(d) for d in target_dirs],
+        'backup': str(BACKUP_DIR),
+        'stats': dict(pipeline.stats),
+        'metrics': pipeline.report,
+        'files': [_item_record(item) for item in results],
+    }
+
+def api_restore(names=None, version=None, source_dir=None, backup_dir=None, consume=False):
+    """恢复备份到源目录; names 为文件名或通配符 (为空时恢复全部), version 为版本序号 (从 1 开始, 默认最新)
+
+    内容相同的文件跳过; consume=True 时恢复后从备份库移除该版本
+    """
+    configure(source_dir, None, backup_dir)
+    store = get_backup_store()
+    selected, unmatched = match_backup_names(store.names, names)
+    index = version - 1 if version else -1
+    results = restore_files(store, [(name, index) for name in selected], SCRIPT_DIR, get_journal(), consume=consume)
+    unknown = [{'name': name, 'error': '备份中没有该文件'} for name in unmatched]
+    get_hash_cache().save()
+    return {
+        'dest': str(SCRIPT_DIR),
+        'restored': sum(1 for r in results if 'entry' in r and not r.get('skipped')),
+        'skipped': sum(1 for r in results if r.get('skipped')),
+        'files': results + unknown,
+    }
+
+def api_status(source_dir=None, target_dir=None, backup_dir=None):
+    """源目录, 游戏目录, 备份目录的状态 (游戏目录文件附带哈希值)"""
+    configure(source_dir, target_dir, backup_dir)
+    metrics = begin_metrics('status')
+    status = {
+        'source': {
+            'dir': str(SCRIPT_DIR),
+            'files': [{'path': str(p), 'size': st.st_size} for p, st in scan_sav_files(SCRIPT_DIR)],
+        },
+        'target': {'dir': str(TARGET_DIR), 'exists': TARGET_DIR.exists(), 'algorithm': HASH_ALGORITHM, 'files': []},
+        'backup': {'dir': str(BACKUP_DIR), 'exists': BACKUP_DIR.exists(), 'names': {}, 'stats': None},
+    }
+    if TARGET_DIR.exists():
+        game_files = list(TARGET_DIR.glob('*.sav'))
+        status['target']['files'] = [
+            {'name': f.name, 'size': f.stat().st_size, 'digest': digest}
+            for f, digest in zip(game_files, hash_files(game_files))
+        ]
+        get_hash_cache().save()
+    if BACKUP_DIR.exists():
+        store = get_backup_store()
+        status['backup']['names'] = {name: store.versions(name) for name in sorted(store.names)}
+        status['backup']['stats'] = store.stats()
+    status['metrics'] = end_metrics(metrics, target_files=len(status['target']['files']))
+    return status
+
+def api_clean(source_dir=None, target_dir=None, patterns=None, older_than=None, untracked=False, delete=None):
+    """清理游戏目录中的 .sav 文件 (默认全部), 默认移入隔离区, 可用 api_undo_clean 撤销
+
+    patterns 为通配符列表, older_than 为天数, untracked=True 只清理安装清单中没有的文件
+    """
+    configure(source_dir, target_dir)
+    delete = CLEAN_MODE == 'delete' if delete is None else delete
+    manifest = get_manifest()
+    names = select_clean_files(TARGET_DIR, patterns, older_than, untracked, manifest)
+    quarantine = None if delete or not names else get_quarantine()
+    batch_dir = quarantine.create(TARGET_DIR) if quarantine else None
+    results = clean_files(TARGET_DIR, names, manifest, get_journal(), quarantine=quarantine, batch_dir=batch_dir)
+    if quarantine:
+        start_quarantine_purge()
+    return {
+        'target': str(TARGET_DIR),
+        'deleted': sum(1 for r in results if 'error' not in r),
+        'quarantine': batch_dir.name if batch_dir and batch_dir.exists() else None,
+        'files': results,
+    }
+
+def api_undo_clean(batch=None, source_dir=None, target_dir=None):
+    """将隔离区中的批次 (默认最近一次清理) 移回游戏目录"""
+    configure(source_dir, target_dir)
+    batch, results = get_quarantine().undo(batch, get_manifest())
+    return {
+        'target': str(TARGET_DIR),
+        'batch': batch,
+        'restored': sum(1 for r in results if 'error' not in r),
+        'files': results,
+    }
+
+def api_verify(deep=False, source_dir=None, target_dir=None):
+    """对照安装清单校验游戏目录"""
+    configure(source_dir, target_dir)
+    metrics = begin_metrics('verify')
+    report = get_manifest().verify(TARGET_DIR, deep=deep)
+    get_hash_cache().save()
+    summary = {key: len(report[key]) for key in ('ok', 'changed', 'missing', 'untracked')}
+    return dict(report, target=str(TARGET_DIR), deep=deep, metrics=end_metrics(metrics, deep=deep, **summary))
+
+def api_watch(source_dir=None, target_dir=None, backup_dir=None, interval=None, debounce=None,
+              on_install=None, stop_event=None, install_existing=True):
+    """监视源目录并自动安装新文件; on_install 收到每批安装结果 (与 api_install 的 files 相同)"""
+    configure(source_dir, target_dir, backup_dir)
+    BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+    watcher = SavWatcher(SCRIPT_DIR, TARGET_DIR, get_backup_store(), get_manifest(), get_journal(),
+                         interval, debounce)
+
+    def report(results):
+        if on_install:
+            on_install([_item_record(item) for item in results])
+
+    watcher.run(report, stop_event, install_existing)
+
+def api_resume(source_dir=None, target_dir=None, backup_dir=None):
+    """继续上次未完成的操作 (批次中记录的目录优先)"""
+    configure(source_dir, target_dir, backup_dir)
+    resumed = []
+    for pending in get_journal().pending():
+        op, results = resume_operation(pending)
+        files = [_item_record(r) if 'st' in r else r for r in results]
+        resumed.append({'op': op, 'batch': pending['batch'], 'files': files})
+    get_hash_cache().save()
+    return {'resumed': resumed}
+
+def _print_result(command, result):
+    """以文本形式输出命令结果"""
+    if command == 'install':
+        for f in result['files']:
+            print(f"{f['action']:<8} {f['name']}  {f.get('digest')}  {f.get('error', '')}".rstrip())
+        st = result['stats']
+        print(f"共 {st['total']} 个, 复制 {st['copied']}, 跳过 {st['skipped']}, 失败 {st['failed']}, "
+              f"耗时 {st['elapsed']:.2f} s")
+        metrics = result['metrics']
+        phases = ', '.join(f"{name} {p['seconds']:.2f} s" for name, p in metrics['phases'].items())
+        hit_rate = metrics['hash_cache']['hit_rate']
+        print(f"阶段耗时: {phases or '-'}; 哈希缓存命中率: {'-' if hit_rate is None else f'{hit_rate:.0%}'}")
+    elif command in ('restore', 'clean', 'undo'):
+        for f in result['files']:
+            state = 'FAIL' if 'error' in f else 'SAME' if f.get('skipped') else 'OK'
+            print(f"{state:<5} {f['name']}  {f.get('error', '')}".rstrip())
+        if result.get('quarantine'):
+            print(f"已移入隔离区: {result['quarantine']} (可用 undo 撤销)")
+    elif command == 'status':
+        print(f"[源目录] {result['source']['dir']}")
+        for f in result['source']['files']:
+            print(f"  {f['path']}")
+        print(f"[游戏目录] {result['target']['dir']}")
+        for f in result['target']['files']:
+            print(f"  {f['name']}  {f['digest']}")
+        print(f"[备份目录] {result['backup']['dir']}")
+        for name, versions in result['backup']['names'].items():
+            print(f"  {name}  ({len(versions)} 个版本)")
+    elif command == 'verify':
+        for key in ('ok', 'changed', 'missing', 'untracked'):
+            for name in result[key]:
+                print(f"{key:<10} {name}")
+    elif command == 'resume':
+        for r in result['resumed']:
+            print(f"{r['op']}: {len(r['files'])} 个文件")
+
+def _has_failures(command, result):
+    if command == 'install':
+        return result['stats']['failed'] > 0
+    if command in ('restore', 'clean', 'undo'):
+        return any('error' in f for f in result['files'])
+    if command == 'verify':
+        return bool(result['changed'] or result['missing'])
+    return False
+
+def cli(argv=None):
+    """命令行入口, 无子命令时进入交互菜单; 返回退出码"""
+    global FORCE_REHASH, COPY_VERIFY, HASH_WORKERS, HASH_ALGORITHM, BACKUP_FORMAT, NAME_CONFLICT_POLICY, _profilers
+    parser = argparse.ArgumentParser(prog='SAV_Manager', description='Ready Or Not SAV 存档管理工具')
+    parser.add_argument('--rehash', action='store_true', help='忽略哈希缓存, 全部重新计算')
+    parser.add_argument('--verify-copy', action='store_true', help='复制后重新读取目标文件校验')
+    parser.add_argument('--workers', type=int, help='并行哈希线程数')
+    parser.add_argument('--algorithm', choices=HASH_ALGORITHMS, help='哈希算法 (默认 md5)')
+    parser.add_argument('--backup-format', choices=('blob', 'chunked'), help='备份格式')
+    parser.add_argument('--cprofile', metavar='FILE',
+                        help='用 cProfile 采样 (含安装流水线的工作线程), 结果写入 FILE, 可用 pstats 查看')
+    parser.add_argument('--on-conflict', choices=NAME_CONFLICT_POLICIES,
+                        help='多个同名源文件时安装哪一个 (默认 newest)')
+
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--source', help='源目录 (默认为程序所在目录)')
+    common.add_argument('--target', action='append', help='游戏存档目录 (install 可重复指定多个)')
+    common.add_argument('--backup', help='备份目录')
+    common.add_argument('--json', action='store_true', help='以 JSON 格式输出结果')
+
+    sub = parser.add_subparsers(dest='command')
+    sub.add_parser('install', parents=[common], help='安装存档')
+    p_restore = sub.add_parser('restore', parents=[common], help='恢复备份')
+    p_restore.add_argument('names', nargs='*', help='要恢复的文件名或通配符 (默认全部)')
+    p_restore.add_argument('--move', action='store_true', help='恢复后从备份库移除该版本 (无其他引用时直接重命名)')
+    p_restore.add_argument('--version', type=int, help='版本序号, 从 1 开始 (默认最新)')
+    sub.add_parser('status', parents=[common], help='查看状态')
+    p_clean = sub.add_parser('clean', parents=[common], help='清理游戏目录中的存档 (默认移入隔离区)')
+    p_clean.add_argument('patterns', nargs='*', help='文件名通配符 (默认全部)')
+    p_clean.add_argument('--older-than', type=float, metavar='DAYS', help='只清理修改时间早于指定天数的文件')
+    p_clean.add_argument('--untracked', action='store_true', help='只清理不在安装清单中的文件')
+    p_clean.add_argument('--delete', action='store_true', help='直接删除, 不移入隔离区')
+    p_undo = sub.add_parser('undo', parents=[common], help='撤销清理: 将隔离区中的文件移回游戏目录')
+    p_undo.add_argument('batch', nargs='?', help='批次名称 (默认最近一次)')
+    p_verify = sub.add_parser('verify', parents=[common], help='对照安装清单校验游戏目录')
+    p_verify.add_argument('--deep', action='store_true', help='重新计算哈希值')
+    sub.add_parser('resume', parents=[common], help='继续上次未完成的操作')
+    p_watch = sub.add_parser('watch', parents=[common], help='监视源目录, 自动安装新增/修改的存档')
+    p_watch.add_argument('--interval', type=float, help=f'轮询间隔秒数 (默认 {WATCH_INTERVAL})')
+    p_watch.add_argument('--debounce', type=float, help=f'文件稳定多少秒后安装 (默认 {WATCH_DEBOUNCE})')
+    p_watch.add_argument('--skip-existing', action='store_true', help='启动时已存在的文件不安装')
+    p_bench = sub.add_parser('bench-hash', help='哈希算法/读取方式微基准测试')
+    p_bench.add_argument('files', nargs='*')
+    p_suite = sub.add_parser('bench', help='在生成的语料上测试 install/status/restore/clean (输出 JSON)')
+    p_suite.add_argument('--profile', action='append', choices=sorted(BENCH_PROFILES),
+                         help=f"语料类型, 可重复指定 (默认 {' '.join(BENCH_DEFAULT_PROFILES)})")
+    p_suite.add_argument('--seed', type=int, default=0, help='随机种子 (默认 0)')
+    p_suite.add_argument('--scale', type=float, default=1.0, help='文件大小缩放比例 (默认 1.0)')
+    p_suite.add_argument('--repeat', type=int, default=1, help='运行轮数, 每个操作取最快一次')
+    p_suite.add_argument('--output', help='结果写入文件 (默认输出到标准输出)')
+    p_suite.add_argument('--keep', action='store_true', help='保留临时目录')
+
+    args = parser.parse_args(argv)
+    FORCE_REHASH = FORCE_REHASH or args.rehash
+    COPY_VERIFY = COPY_VERIFY or args.verify_copy
+    HASH_WORKERS = args.workers or HASH_WORKERS
+    HASH_ALGORITHM = args.algorithm or HASH_ALGORITHM
+    BACKUP_FORMAT = args.backup_format or BACKUP_FORMAT
+    NAME_CONFLICT_POLICY = args.on_conflict or NAME_CONFLICT_POLICY
+
+    if not args.cprofile:
+        return _run_command(args)
+    _profilers = [cProfile.Profile()]
+    _profilers[0].enable()
+    try:
+        return _run_command(args)
+    finally:
+        _profilers[0].disable()
+        stats = pstats.Stats(_profilers[0])
+        for profiler in _profilers[1:]:
+            stats.add(profiler)
+        stats.dump_stats(args.cprofile)
+        _profilers = None
+
+def _run_command(args):
+    """执行子命令, 返回退出码"""
+    targets = getattr(args, 'target', None) or []
+    target = targets[0] if targets else None
+    if args.command is None:
+        main()
+        return 0
+    if args.command == 'bench-hash':
+        run_hash_benchmark(args.files)
+        return 0
+    if args.command == 'bench':
+        report = run_benchmark_suite(args.profile or BENCH_DEFAULT_PROFILES, args.seed, args.scale,
+                                     args.repeat, args.keep)
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if args.output:
+            with open(args.output, 'w', encoding='utf-8') as f:
+                f.write(text + '\n')
+        else:
+            print(text)
+        return 0
+    if args.command == 'watch':
+        def on_install(files):
+            for f in files:
+                if args.json:
+                    print(json.dumps(f, ensure_ascii=False), flush=True)
+                else:
+                    print(f"{datetime.now().strftime('%H:%M:%S')} {f['action']:<8} {f['name']}  "
+                          f"{f.get('digest')}  {f.get('error', '')}".rstrip(), flush=True)
+        try:
+            api_watch(args.source, target, args.backup, args.interval, args.debounce,
+                      on_install, install_existing=not args.skip_existing)
+        except KeyboardInterrupt:
+            pass
+        return 0
+
+    if args.command == 'install':
+        result = api_install(args.source, targets or None, args.backup)
+    elif args.command == 'restore':
+        result = api_restore(args.names, args.version, args.source, args.backup, args.move)
+    elif args.command == 'status':
+        result = api_status(args.source, target, args.backup)
+    elif args.command == 'clean':
+        result = api_clean(args.source, target, args.patterns, args.older_than, args.untracked, args.delete or None)
+    elif args.command == 'undo':
+        try:
+            result = api_undo_clean(args.batch, args.source, target)
+        except FileNotFoundError as e:
+            print(e, file=sys.stderr)
+            return 1
+    elif args.command == 'verify':
+        result = api_verify(args.deep, args.source, target)
+    else:
+        result = api_resume(args.source, target, args.backup)
+
+    # 等待后台的隔离区清理完成后再退出
+    if _purge_thread is not None:
+        _purge_thread.join()
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+    else:
+        _print_result(args.command, result)
+    return 1 if _has_failures(args.command, result) else 0
+
 if __name__ == '__main__':
-    main()
+    sys.exit(cli())